@@ -0,0 +1,307 @@
+import os
+import io
+import sys
+import json
+import time
+import random
+import argparse
+import timeit
+import tempfile
+import contextlib
+import subprocess
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+import process_ochecklist_report as report
+from local_ftp_server import serve_ftp
+
+"""
+Benchmark of the report processing on synthetic O Checklist reports
+Usage: python src/benchmark.py --runners 5000 --devices 4
+"""
+
+CLASSES = ['H21', 'D21', 'H35', 'D35', 'H45', 'D45', 'H14', 'D14', 'HDR']
+CLUBS = ['Fife', 'Oldham', 'Rochdale', 'Aberdeen', 'Trafford', 'Stockton-on-Tees', 'North Somerset']
+NAMES = ['Lincoln Miller', 'Stella Watson', 'Nova Morris', 'Nolan Rogers', 'Hailey Butler', 'Ezra Butler']
+
+# Stage is reported as slower when it takes more than this ratio of the previous result
+REGRESSION_RATIO = 1.1
+
+def main() -> None:
+    args = parse_args()
+    files = generate_reports(args.runners, args.devices, args.change_ratio)
+    size = sum(len(content) for _, content in files)
+    print(f"{args.devices} reports with {args.runners} runners, {size / 1024:.0f} kB")
+
+    results = benchmark_stages(files, args.repeat, args.pool_size)
+    results.update(benchmark_rendering(args.rows, args.repeat))
+    print_results(results, load_previous_results(args.results, args))
+    store_results(args.results, args, results)
+
+    if args.loaders:
+        benchmark_loaders(files[0][1], args.repeat)
+
+def generate_report(runners, change_ratio=0.1, seed=1, device=0, devices=1):
+    """
+    Create synthetic O Checklist report
+    :param runners: number of runners in the event
+    :param change_ratio: share of runners with a change
+    :param seed: seed of the random generator, same seed gives same report
+    :param device: number of the device, each device reports the runners of its start corridor
+    :param devices: number of the devices in the event
+    :return: yaml file content
+    """
+    rng = random.Random(seed)
+    tz = timezone(timedelta(hours=2))
+    first_start = datetime(2023, 5, 16, 10, 0, tzinfo=tz)
+    lines = ['Version: 1.0',
+             'Creator: "O Checklist 3.3.1"',
+             'Created: ' + (first_start + timedelta(hours=3, minutes=device)).isoformat(),
+             'Data:']
+
+    for i in range(runners):
+        # Values are drawn for all runners, so the event is same for any number of devices
+        start_time = first_start + timedelta(minutes=i // len(CLASSES))
+        changed_at = (start_time + timedelta(seconds=rng.randint(0, 600))).isoformat()
+        change = rng.choice(['DNS', 'LateStart', 'NewCard', 'Comment']) if rng.random() < change_ratio else None
+        name, club = rng.choice(NAMES), rng.choice(CLUBS)
+        card, new_card = rng.randint(10000, 9999999), rng.randint(10000, 9999999)
+        if i % devices != device:
+            continue
+        status = {'DNS': 'DNS', 'LateStart': 'Late start'}.get(change, 'Started OK')
+
+        lines += ['  - Runner:',
+                  f'      StartStatus: {status}',
+                  f'      Id:          "{i + 1}"',
+                  f'      StartTime:   {start_time.isoformat()}',
+                  f'      ClassName:   "{CLASSES[i % len(CLASSES)]}"',
+                  f'      Name:        "{name}"',
+                  f'      Org:         "{club}"',
+                  f'      Card:        {card}']
+        if change == 'NewCard':
+            lines.append(f'      NewCard:     {new_card}')
+        elif change == 'Comment':
+            lines.append('      Comment:     "Neměl číslo"')
+
+        if change is None:
+            lines.append('    ChangeLog:     null')
+        else:
+            lines += ['    ChangeLog:',
+                      f'      {change}: {changed_at}']
+
+    return '\n'.join(lines) + '\n'
+
+def generate_reports(runners, devices=1, change_ratio=0.1, seed=1):
+    """
+    Create synthetic reports of all devices in the event
+    :param runners: number of runners in the event
+    :param devices: number of the devices, runners are split between them
+    :param change_ratio: share of runners with a change
+    :param seed: seed of the random generator
+    :return: list of lists with filename and yaml file content, same as download_file_from_ftp
+    """
+    return [[f'report-{device + 1}.yaml', generate_report(runners, change_ratio, seed, device, devices)]
+            for device in range(devices)]
+
+def measure(function, repeat=3):
+    """
+    Measure the function - best wall and cpu time of the runs and peak memory of one extra traced run
+    :param function: measured function without arguments
+    :param repeat: number of the timed runs
+    :return: dictionary with seconds, cpu_seconds and peak_bytes
+    """
+    wall = []
+    cpu = []
+    for _ in range(repeat):
+        start, start_cpu = time.perf_counter(), time.process_time()
+        function()
+        wall.append(time.perf_counter() - start)
+        cpu.append(time.process_time() - start_cpu)
+
+    # Tracing slows the run down, it is not part of the timing
+    tracemalloc.start()
+    try:
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'seconds': min(wall), 'cpu_seconds': min(cpu), 'peak_bytes': peak}
+
+def benchmark_stages(files, repeat=3, pool_size=1):
+    """
+    Measure the stages of the report pipeline separately - download from local ftp server, processing and rendering
+    :param files: list of lists with filename and yaml file content
+    :param repeat: number of measurements, the best one is used
+    :param pool_size: number of parallel ftp connections
+    :return: dictionary stage -> result of measure
+    """
+    results = {}
+    quiet = contextlib.redirect_stdout(io.StringIO())
+
+    with serve_ftp(files) as server, tempfile.TemporaryDirectory() as folder:
+        credentials = {'server': '127.0.0.1', 'port': server.server_address[1], 'login': 'benchmark', 'password': 'benchmark',
+                       'pool_size': pool_size, 'timeout': 60}
+        results['download'] = measure(lambda: report.download_file_from_ftp(**credentials), repeat)
+        # Unchanged files are read from the sync cache
+        cache_dir = os.path.join(folder, 'ftp-cache')
+        report.download_file_from_ftp(cache_dir=cache_dir, **credentials)
+        results['download_cached'] = measure(
+            lambda: report.download_file_from_ftp(cache_dir=cache_dir, **credentials), repeat)
+
+        with quiet:
+            results['process'] = measure(lambda: report.process_downloaded_yaml(files), repeat)
+            parse_cache = os.path.join(folder, 'parse-cache')
+            report.process_downloaded_yaml(files, cache_dir=parse_cache)
+            results['process_cached'] = measure(lambda: report.process_downloaded_yaml(files, cache_dir=parse_cache),
+                                                repeat)
+            changes = report.process_downloaded_yaml(files)
+
+        # Change of one row, other rows are rendered from the cache
+        changed = dict(changes)
+        if changes['dns']:
+            changed['dns'] = changes['dns'][:-1] + [changes['dns'][-1]._replace(name='Changed Name')]
+        report_name = os.path.join(folder, 'online-report')
+
+        def render(changes, cached):
+            if not cached:
+                report.ROW_CACHE.clear()
+            report.generate_html_report(changes, report_name)
+
+        results['render'] = measure(lambda: render(changes, False), repeat)
+        results['render_cached'] = measure(lambda: render(changed, True), repeat)
+    return results
+
+def benchmark_rendering(rows=10000, repeat=3):
+    """
+    Measure rendering of the html report with fixed number of rows, first run renders all rows, next runs only
+    the changed ones
+    :param rows: number of rows in the report
+    :param repeat: number of measurements, the best one is used
+    :return: dictionary stage -> result of measure
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        changes = report.process_downloaded_yaml([['report.yaml', generate_report(rows, change_ratio=1)]])
+    # Change of one row
+    changed = dict(changes)
+    changed['dns'] = changes['dns'][:-1] + [changes['dns'][-1]._replace(name='Changed Name')]
+
+    with tempfile.TemporaryDirectory() as folder:
+        report_name = os.path.join(folder, 'online-report')
+
+        def render(changes, cached):
+            if not cached:
+                report.ROW_CACHE.clear()
+            report.generate_html_report(changes, report_name)
+
+        return {'render_rows': measure(lambda: render(changes, False), repeat),
+                'render_rows_cached': measure(lambda: render(changed, True), repeat)}
+
+def print_results(results, previous=None):
+    """
+    Print results of the stages, comparison with the previous results of the same benchmark is added
+    :param results: dictionary stage -> result of measure
+    :param previous: stored results of the previous run (optional)
+    """
+    print("Stages:")
+    for stage, result in results.items():
+        line = (f"- {stage}: {result['seconds'] * 1000:.1f} ms (cpu {result['cpu_seconds'] * 1000:.1f} ms), "
+                f"peak memory {result['peak_bytes'] / 1024 / 1024:.2f} MB")
+        old = previous['results'].get(stage) if previous is not None else None
+        if old is not None and old['seconds'] > 0:
+            ratio = result['seconds'] / old['seconds']
+            line += f", {ratio:.2f}x of {previous['version']}"
+            if ratio > REGRESSION_RATIO:
+                line += " - SLOWER"
+        print(line)
+
+def benchmark_version():
+    """
+    Version of the measured code - git commit, changed working tree is marked
+    """
+    folder = os.path.dirname(os.path.abspath(__file__))
+    try:
+        version = subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=folder, capture_output=True,
+                                 text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return version or 'unknown'
+
+def benchmark_parameters(args):
+    """
+    Parameters of the benchmark, only results with same parameters are compared
+    """
+    return {'runners': args.runners, 'devices': args.devices, 'change_ratio': args.change_ratio,
+            'pool_size': args.pool_size, 'rows': args.rows, 'python': sys.version.split()[0]}
+
+def load_previous_results(path, args):
+    """
+    Load last stored results of the benchmark with same parameters
+    :param path: path to the json lines file with results
+    :param args: parsed arguments
+    :return: stored results or None
+    """
+    parameters = benchmark_parameters(args)
+    previous = None
+    try:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    stored = json.loads(line)
+                except ValueError:
+                    continue
+                if stored.get('parameters') == parameters:
+                    previous = stored
+    except OSError:
+        return None
+    return previous
+
+def store_results(path, args, results):
+    """
+    Append results of the benchmark to the json lines file, one line per run
+    :param path: path to the json lines file
+    :param args: parsed arguments
+    :param results: dictionary stage -> result of measure
+    """
+    stored = {'version': benchmark_version(), 'time': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+              'parameters': benchmark_parameters(args), 'results': results}
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(stored) + '\n')
+
+def benchmark_loaders(content, repeat=3):
+    """
+    Compare yaml loaders on the report
+    :param content: yaml file content
+    :param repeat: number of measurements, the best one is printed
+    """
+    expected = report.load_report(content, 'python')
+    loaders = ['python', 'ochecklist']
+    if report.YAML_C_LOADER is not None:
+        loaders.insert(1, 'libyaml')
+
+    print("YAML loaders:")
+    for loader in loaders:
+        if report.load_report(content, loader) != expected:
+            print(f"- {loader}: different result!")
+            continue
+        best = min(timeit.repeat(lambda: report.load_report(content, loader), number=1, repeat=repeat))
+        print(f"- {loader}: {best * 1000:.1f} ms")
+
+def parse_args() -> argparse.Namespace:
+    """
+    Parse input arguments
+    """
+    parser = argparse.ArgumentParser(description='Benchmark of the O Checklist report processing')
+    parser.add_argument('--runners', type=int, default=5000, help='number of runners in the event (default: 5000)')
+    parser.add_argument('--devices', type=int, default=4, help='number of devices with a report (default: 4)')
+    parser.add_argument('--change-ratio', type=float, default=0.1, help='share of runners with a change (default: 0.1)')
+    parser.add_argument('--pool-size', type=int, default=4, help='number of parallel ftp connections (default: 4)')
+    parser.add_argument('--rows', type=int, default=10000,
+                        help='number of rows in the html report of the render_rows stage (default: 10000)')
+    parser.add_argument('--repeat', type=int, default=3, help='number of measurements (default: 3)')
+    parser.add_argument('--results', default='benchmark-results.jsonl',
+                        help='file with stored results, new results are compared with the last ones '
+                             '(default: benchmark-results.jsonl)')
+    parser.add_argument('--loaders', action='store_true', help='compare yaml loaders on the first report')
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    main()
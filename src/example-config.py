@@ -4,5 +4,60 @@ ftp_server_credentials = {
     'server': 'your-host',
     'login': 'your-username',
     'password': 'your-password',
-    'subfolder': '/your-subfolder'
-}
\ No newline at end of file
+    'subfolder': '/your-subfolder',
+    # Local copy of the downloaded files, unchanged files are not downloaded again (optional)
+    'cache_dir': 'ftp-cache',
+    # Number of parallel ftp connections used for downloading of the files
+    'pool_size': 4,
+    # Max seconds for the download of one file
+    'timeout': 30
+}
+
+# Loader of the yaml reports: 'auto' (fast parser for O Checklist reports), 'libyaml' or 'python'
+yaml_loader = 'auto'
+
+# Cache of the processed reports, unchanged files are not parsed again (optional)
+parse_cache = {
+    'cache_dir': 'parse-cache',
+    # Max size of the cache in bytes
+    'max_bytes': 50 * 1024 * 1024,
+    # Max age of the cache entries in seconds
+    'max_age': 24 * 3600
+}
+
+# Store of the changes by event (event_id argument or day of the reports), only new changes are processed and
+# changes stay in the report also when a file disappears from the ftp server (None disables it),
+# e.g. 'changes.sqlite'
+change_store = None
+
+# Startlist in IOF XML 3.0, class, club and start time missing in the reports are filled from it (None disables it)
+startlist = None
+
+# Live update of the opened report from the json feed, polling interval in seconds (None disables it)
+json_feed_interval = 10
+
+# Tables with more rows are rendered only in the visible part, which keeps big reports fast (None disables it)
+virtual_table_rows = 500
+
+# Metrics of each run (stage timings, downloaded bytes, processed files and rows, cache hits) written next to
+# the report as <report>-metrics.json and/or <report>-metrics.prom, formats 'json' and 'prometheus' (None disables it)
+metrics_formats = ['json']
+
+# Solved rows shared between more operator stations, used with the --sync switch
+solved_sync = {
+    # Address and port of the sync server, empty host listens on all interfaces
+    'host': '',
+    'port': 8001,
+    # Solved rows are kept between restarts of the script (optional)
+    'state_file': 'solved-state.json'
+}
+
+# More events or stages at once (optional), each event runs in its own process and has its own report
+# online-report-<event_id>.html. Values in the event dictionary override the ones above, ftp cache and change
+# store get a separate folder/file for each event
+# events = [
+#     {'event_id': 'stage1', 'ftp_server_credentials': {**ftp_server_credentials, 'subfolder': '/stage1'}},
+#     {'event_id': 'stage2', 'ftp_server_credentials': {**ftp_server_credentials, 'subfolder': '/stage2'}},
+# ]
+# Max number of the processes for the events, one per event when not set
+# event_workers = 4
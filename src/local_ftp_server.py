@@ -0,0 +1,112 @@
+import socket
+import fnmatch
+import threading
+import contextlib
+import socketserver
+
+"""
+Local ftp server with the files in memory, stand-in of the ftp server with O Checklist reports
+Used by the benchmark and the tests
+"""
+
+# Modification time reported by MDTM when the file has no own time
+DEFAULT_MODIFIED = '20230516213823'
+
+@contextlib.contextmanager
+def serve_ftp(files, fingerprints=True):
+    """
+    Run local ftp server on a free port
+    :param files: list of lists with filename and file content (str or bytes)
+    :param fingerprints: server supports SIZE and MDTM commands
+    :return: server, files can be changed in server.files (name -> bytes) and server.modified (name -> MDTM value),
+             downloaded files are listed in server.retrieved, downloads of files in server.failing fail
+             and server.logins counts the logins
+    """
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), FTPHandler)
+    server.daemon_threads = True
+    server.files = {filename: content.encode('utf-8') if isinstance(content, str) else content
+                    for filename, content in files}
+    server.modified = {}
+    server.fingerprints = fingerprints
+    server.retrieved = []
+    server.failing = set()
+    server.logins = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+class FTPHandler(socketserver.StreamRequestHandler):
+    """
+    Minimal ftp server - commands used by download_file_from_ftp in passive mode
+    """
+    def handle(self):
+        server = self.server
+        files = server.files
+        passive = None
+        self.reply('220 Local ftp server')
+        try:
+            for line in self.rfile:
+                command, _, argument = line.decode('utf-8').strip().partition(' ')
+                command = command.upper()
+                if command == 'USER':
+                    self.reply('331 Password required')
+                elif command == 'PASS':
+                    server.logins += 1
+                    self.reply('230 Logged in')
+                elif command in ('TYPE', 'NOOP'):
+                    self.reply('200 OK')
+                elif command == 'CWD':
+                    self.reply('250 OK')
+                elif command == 'PASV':
+                    if passive is not None:
+                        passive.close()
+                    passive = socket.create_server(('127.0.0.1', 0))
+                    port = passive.getsockname()[1]
+                    self.reply(f'227 Entering Passive Mode (127,0,0,1,{port >> 8},{port & 255})')
+                elif command == 'NLST':
+                    names = [name for name in list(files) if fnmatch.fnmatch(name, argument or '*')]
+                    self.send_data(passive, ''.join(name + '\r\n' for name in names).encode('utf-8'))
+                    passive = None
+                elif command in ('SIZE', 'MDTM') and not server.fingerprints:
+                    self.reply('502 Command not implemented')
+                elif command == 'SIZE' and argument in files:
+                    self.reply(f'213 {len(files[argument])}')
+                elif command == 'MDTM' and argument in files:
+                    self.reply('213 ' + server.modified.get(argument, DEFAULT_MODIFIED))
+                elif command == 'RETR' and argument in server.failing:
+                    self.reply('451 Local error in processing')
+                elif command == 'RETR' and argument in files:
+                    server.retrieved.append(argument)
+                    self.send_data(passive, files[argument])
+                    passive = None
+                elif command == 'QUIT':
+                    self.reply('221 Bye')
+                    break
+                elif command in ('SIZE', 'MDTM', 'RETR'):
+                    self.reply('550 File not found')
+                else:
+                    self.reply('502 Command not implemented')
+        finally:
+            if passive is not None:
+                passive.close()
+
+    def reply(self, text):
+        self.wfile.write((text + '\r\n').encode('utf-8'))
+
+    def send_data(self, passive, data):
+        """
+        Send data over the passive connection
+        """
+        if passive is None:
+            self.reply('425 Use PASV first')
+            return
+        self.reply('150 Opening data connection')
+        with passive:
+            connection, _ = passive.accept()
+            with connection:
+                connection.sendall(data)
+        self.reply('226 Transfer complete')
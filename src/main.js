@@ -1,59 +1,75 @@
-// Highlight solved rows with different background
-document.addEventListener("DOMContentLoaded", function () {
-  const checkboxes = document.querySelectorAll(".solved");
-  checkboxes.forEach(function (checkbox) {
-    checkbox.addEventListener("change", function () {
-      const row = this.closest("tr");
-      if (this.checked) {
-        row.classList.remove("row-unsolved");
-        row.classList.add("row-solved");
-      } else {
-        row.classList.remove("row-solved");
-        row.classList.add("row-unsolved");
-      }
-    }
-    );
-  });
+// Solved rows by table, loaded once from local storage and written in batches per event and table
+const SOLVED_PREFIX = 'ochecklist-solved';
+const SOLVED_SAVE_DELAY = 500;
+const SOLVED_MAX_AGE = 7 * 24 * 3600 * 1000;
+const solvedState = {
+  event: document.body.dataset.event || location.pathname,
+  tables: new Map(),
+  dirty: new Set(),
+  timer: null,
+  sync: null
+};
+const SOLVED_SYNC_DELAY = 200;
+const SOLVED_SYNC_RETRY = 5000;
+cleanSolvedStorage();
+// Pending changes are written before the page is closed
+window.addEventListener('pagehide', flushSolvedRows);
+document.addEventListener('visibilitychange', () => {
+  if (document.visibilityState === 'hidden') {
+    flushSolvedRows();
+  }
 });
 
-// Get all the checkboxes with solved class
-const checkboxes = document.querySelectorAll('.solved');
+// Virtual tables render only the visible rows from the data array
+const virtualTables = new Map();
+const VIRTUAL_ROW_HEIGHT = 24;
+const VIRTUAL_OVERSCAN = 10;
+document.querySelectorAll('table[data-virtual]').forEach(initVirtualTable);
 
-// Add event listener to each checkbox
-checkboxes.forEach((checkbox) => {
-  checkbox.addEventListener('change', (event) => {
-    // Get the row element and the attributes
-    const row = event.target.parentElement.parentElement;
-    const rowId = row.id;
-    const tableId = row.closest('table').id;
-    const checked = event.target.checked;
+// Initialize checkboxes of the solved rows
+document.querySelectorAll('input.solved').forEach(initSolvedCheckbox);
 
-    // Save the table row status to local storage
-    saveTableRowStatus(tableId, rowId, checked);
-  });
+// One change listener per table handles all its checkboxes
+document.querySelectorAll('table').forEach((table) => {
+  table.addEventListener('change', onSolvedChange);
 });
 
-// Load the table row status from local storage and tick the checkboxes
-checkboxes.forEach((checkbox) => {
+/**
+ * Load stored status of the checkbox
+ * @param {Element} checkbox 
+ */
+function initSolvedCheckbox(checkbox) {
   // Get the row element
-  const row = checkbox.parentElement.parentElement;
-  const rowId = row.id;
+  const row = checkbox.closest('tr');
   // Get the id of the parent table
   const tableId = row.closest('table').id;
-  const storedStatus = loadTableRowStatus(tableId, rowId);
   // Set the checkbox checked status
-  checkbox.checked = storedStatus;
+  checkbox.checked = loadTableRowStatus(tableId, row.id);
 
   // Change row background color
   setSolvedRowsBackground(checkbox);
-});
+}
+
+/**
+ * Highlight solved row and save its status
+ * @param {Event} event - change event delegated to the table
+ */
+function onSolvedChange(event) {
+  const checkbox = event.target;
+  if (!checkbox.matches('input.solved')) {
+    return;
+  }
+  // Highlight solved rows with different background
+  setSolvedRowsBackground(checkbox);
+  // Save the table row status to local storage
+  saveTableRowStatus(event.currentTarget.id, checkbox.closest('tr').id, checkbox.checked);
+}
 
 /**
  * Set background color of the solved row
  * @param {Element} checkbox 
  */
 function setSolvedRowsBackground(checkbox) {
-  console.log('Set solved')
   const row = checkbox.closest("tr");
       if (checkbox.checked) {
         row.classList.remove("row-unsolved");
@@ -65,33 +81,259 @@ function setSolvedRowsBackground(checkbox) {
 }
 
 /**
- * Store row status in local storage
+ * Store row status, changes are written to local storage in batches
  * @param {Attr} tableId - id of the parent table
  * @param {Attr} rowId - id of the row
  * @param {Attr} checked - checkbox checked status
  */
 function saveTableRowStatus(tableId, rowId, checked) {
-  // Create a unique key using tableId and rowId
-  const key = `${tableId}-${rowId}`;
+  setSolvedRow(tableId, rowId, checked);
+
+  // Only the last status of the row is sent to the sync server
+  const sync = solvedState.sync;
+  if (sync) {
+    sync.pending.set(`${tableId}\n${rowId}`, [tableId, rowId, checked]);
+    clearTimeout(sync.timer);
+    sync.timer = setTimeout(sendSolvedChanges, SOLVED_SYNC_DELAY);
+  }
+}
+
+/**
+ * Change row status in the memory and schedule write to local storage
+ * @param {String} tableId - id of the parent table
+ * @param {String} rowId - id of the row
+ * @param {Boolean} checked - checkbox checked status
+ */
+function setSolvedRow(tableId, rowId, checked) {
+  const rows = getSolvedRows(tableId);
   if (checked) {
-    // Store the status in local storage
-    localStorage.setItem(key, true);
+    rows.add(rowId);
   } else {
-    // Remove the status from local storage
-    localStorage.removeItem(key);
+    rows.delete(rowId);
   }
+  solvedState.dirty.add(tableId);
+
+  // Debounced write, more ticks in a short time are written at once
+  clearTimeout(solvedState.timer);
+  solvedState.timer = setTimeout(flushSolvedRows, SOLVED_SAVE_DELAY);
 }
 
 /**
- * Load row status from the local storage
+ * Load row status from the memory
  * @param {Attr} tableId - id of the parent table
  * @param {Attr} rowId - id of the row
  * @returns Return the stored status as boolean
  */
 function loadTableRowStatus(tableId, rowId) {
-  // Create the unique key
-  const key = `${tableId}-${rowId}`;
-  return localStorage.getItem(key) === 'true';
+  return getSolvedRows(tableId).has(rowId);
+}
+
+/**
+ * Get solved rows of the table, they are read from local storage only once
+ * @param {String} tableId - id of the table
+ * @returns Return set of the solved row ids
+ */
+function getSolvedRows(tableId) {
+  let rows = solvedState.tables.get(tableId);
+  if (!rows) {
+    const stored = JSON.parse(localStorage.getItem(getSolvedKey(tableId)) || 'null');
+    rows = new Set(stored ? stored.rows : []);
+    solvedState.tables.set(tableId, rows);
+  }
+  return rows;
+}
+
+/**
+ * Write changed tables to local storage
+ */
+function flushSolvedRows() {
+  clearTimeout(solvedState.timer);
+  solvedState.dirty.forEach((tableId) => {
+    const rows = solvedState.tables.get(tableId);
+    localStorage.setItem(getSolvedKey(tableId), JSON.stringify({ updated: Date.now(), rows: [...rows] }));
+  });
+  solvedState.dirty.clear();
+}
+
+/**
+ * Key of the local storage with solved rows of the table in the current event
+ * @param {String} tableId - id of the table
+ * @returns Return the key
+ */
+function getSolvedKey(tableId) {
+  return `${SOLVED_PREFIX}:${solvedState.event}:${tableId}`;
+}
+
+/**
+ * Drop solved rows of the old events and move rows stored by older versions (one key per row) to the current event
+ */
+function cleanSolvedStorage() {
+  const now = Date.now();
+  const tableIds = Array.from(document.querySelectorAll('table[id]'), (table) => table.id);
+  const keys = [];
+  for (let i = 0; i < localStorage.length; i++) {
+    keys.push(localStorage.key(i));
+  }
+
+  keys.forEach((key) => {
+    if (key.startsWith(SOLVED_PREFIX + ':')) {
+      if (key.startsWith(`${SOLVED_PREFIX}:${solvedState.event}:`)) {
+        return;
+      }
+      try {
+        const stored = JSON.parse(localStorage.getItem(key));
+        if (now - stored.updated < SOLVED_MAX_AGE) {
+          return;
+        }
+      } catch (error) {
+        // Broken entry is removed
+      }
+      localStorage.removeItem(key);
+      return;
+    }
+
+    // Old format - key is table id and row id
+    const tableId = tableIds.find((id) => key.startsWith(id + '-'));
+    if (tableId && localStorage.getItem(key) === 'true') {
+      getSolvedRows(tableId).add(key.slice(tableId.length + 1));
+      solvedState.dirty.add(tableId);
+      localStorage.removeItem(key);
+    }
+  });
+  flushSolvedRows();
+}
+
+// Solved rows shared with other opened reports over the sync server
+if (document.body.dataset.sync) {
+  const address = document.body.dataset.sync;
+  solvedState.sync = {
+    // Only port is set - server runs on the same host as the report
+    url: /^[0-9]+$/.test(address)
+      ? `${location.protocol === 'https:' ? 'https:' : 'http:'}//${location.hostname || 'localhost'}:${address}`
+      : address.replace(/\/$/, ''),
+    version: null,
+    pending: new Map(),
+    timer: null
+  };
+  pollSolvedSync(solvedState.sync);
+}
+
+/**
+ * Url of the solved rows of the current event on the sync server
+ * @param {Object} sync - sync settings and state
+ * @returns Return the url
+ */
+function getSolvedSyncUrl(sync) {
+  return `${sync.url}/solved/${encodeURIComponent(solvedState.event)}`;
+}
+
+/**
+ * Wait for changes from the sync server in a loop (long polling)
+ * @param {Object} sync - sync settings and state
+ */
+async function pollSolvedSync(sync) {
+  while (true) {
+    try {
+      const since = sync.version === null ? '' : `?since=${sync.version}`;
+      const response = await fetch(getSolvedSyncUrl(sync) + since, { cache: 'no-store' });
+      if (!response.ok) {
+        throw new Error(`HTTP ${response.status}`);
+      }
+      applySolvedSync(sync, await response.json());
+    } catch (error) {
+      console.log('Solved rows sync failed', error);
+      await new Promise((resolve) => setTimeout(resolve, SOLVED_SYNC_RETRY));
+    }
+  }
+}
+
+/**
+ * Apply response of the sync server - list of changes or all solved rows
+ * @param {Object} sync - sync settings and state
+ * @param {Object} data - version and changes or rows
+ */
+function applySolvedSync(sync, data) {
+  if (data.changes) {
+    data.changes.forEach(([tableId, rowId, checked]) => {
+      // Own change which was not sent yet wins
+      if (!sync.pending.has(`${tableId}\n${rowId}`) && loadTableRowStatus(tableId, rowId) !== checked) {
+        setSolvedRow(tableId, rowId, checked);
+        updateSolvedCheckbox(tableId, rowId);
+      }
+    });
+  } else {
+    const tableIds = Array.from(document.querySelectorAll('table[id]'), (table) => table.id);
+    // Empty server - rows solved in this browser are sent to it
+    if (data.version === 0) {
+      tableIds.forEach((tableId) => {
+        getSolvedRows(tableId).forEach((rowId) => sync.pending.set(`${tableId}\n${rowId}`, [tableId, rowId, true]));
+      });
+      sendSolvedChanges();
+    } else {
+      tableIds.forEach((tableId) => {
+        const rows = new Set(data.rows[tableId] || []);
+        sync.pending.forEach(([pendingTableId, rowId, checked]) => {
+          if (pendingTableId === tableId && checked) {
+            rows.add(rowId);
+          } else if (pendingTableId === tableId) {
+            rows.delete(rowId);
+          }
+        });
+        solvedState.tables.set(tableId, rows);
+        solvedState.dirty.add(tableId);
+      });
+      flushSolvedRows();
+      document.querySelectorAll('input.solved').forEach(initSolvedCheckbox);
+    }
+  }
+  sync.version = data.version;
+}
+
+/**
+ * Show changed status of the row if it is rendered
+ * @param {String} tableId - id of the table
+ * @param {String} rowId - id of the row
+ */
+function updateSolvedCheckbox(tableId, rowId) {
+  const table = document.getElementById(tableId);
+  const row = table && table.querySelector('#' + CSS.escape(rowId));
+  const checkbox = row && row.querySelector('input.solved');
+  if (checkbox) {
+    initSolvedCheckbox(checkbox);
+  }
+}
+
+/**
+ * Send changed rows to the sync server, failed changes are sent again later
+ */
+async function sendSolvedChanges() {
+  const sync = solvedState.sync;
+  clearTimeout(sync.timer);
+  if (sync.pending.size === 0) {
+    return;
+  }
+  const changes = sync.pending;
+  sync.pending = new Map();
+
+  try {
+    // Plain text does not need the CORS preflight request
+    const response = await fetch(getSolvedSyncUrl(sync), {
+      method: 'POST',
+      headers: { 'Content-Type': 'text/plain' },
+      body: JSON.stringify({ changes: Array.from(changes.values()) })
+    });
+    if (!response.ok) {
+      throw new Error(`HTTP ${response.status}`);
+    }
+  } catch (error) {
+    console.log('Solved rows sync failed', error);
+    changes.forEach((change, key) => {
+      if (!sync.pending.has(key)) {
+        sync.pending.set(key, change);
+      }
+    });
+    sync.timer = setTimeout(sendSolvedChanges, SOLVED_SYNC_RETRY);
+  }
 }
 
 /**
@@ -100,24 +342,374 @@ function loadTableRowStatus(tableId, rowId) {
  * @param {Element} tableId - id of the parent table
  */
 function sortTable(columnIndex, tableId) {
-  var table, rows, switching, i, x, y, shouldSwitch;
-  table = document.getElementById(tableId);
-  switching = true;
-  while (switching) {
-    switching = false;
-    rows = table.rows;
-    for (i = 1; i < rows.length - 1; i++) {
-      shouldSwitch = false;
-      x = rows[i].getElementsByTagName("TD")[columnIndex];
-      y = rows[i + 1].getElementsByTagName("TD")[columnIndex];
-      if (x.innerHTML.toLowerCase() > y.innerHTML.toLowerCase()) {
-        shouldSwitch = true;
-        break;
-      }
+  const virtual = virtualTables.get(tableId);
+  if (virtual) {
+    sortVirtualTable(virtual, columnIndex);
+    return;
+  }
+
+  const table = document.getElementById(tableId);
+  const body = table.tBodies[0] || table;
+  // Header and empty table rows stay in place
+  const rows = Array.from(body.rows).filter((row) =>
+    row.cells.length > columnIndex && row.cells[columnIndex].tagName === 'TD');
+
+  // Keys are read once per row, sort is stable
+  const keyedRows = rows.map((row) => [getSortKey(row.cells[columnIndex]), row]);
+  keyedRows.sort((a, b) => compareSortKeys(a[0], b[0]));
+
+  // Rows are moved back in one DOM operation
+  const fragment = document.createDocumentFragment();
+  keyedRows.forEach(([, row]) => fragment.appendChild(row));
+  body.appendChild(fragment);
+}
+
+/**
+ * Get sort key of the cell - data-sort attribute or text, numbers are compared as numbers
+ * @param {Element} cell - table cell
+ * @returns Return the sort key as number or string
+ */
+function getSortKey(cell) {
+  const checkbox = cell.querySelector('input.solved');
+  if (checkbox) {
+    return checkbox.checked ? 1 : 0;
+  }
+  return toSortKey(cell.dataset.sort !== undefined ? cell.dataset.sort : cell.textContent.toLowerCase());
+}
+
+/**
+ * Convert text to sort key, numbers are compared as numbers
+ * @param {String} key - text of the key
+ * @returns Return the sort key as number or string
+ */
+function toSortKey(key) {
+  const number = Number(key);
+  return key !== '' && !isNaN(number) ? number : key;
+}
+
+/**
+ * Compare two sort keys, numbers are before strings
+ * @param {Number|String} a
+ * @param {Number|String} b
+ * @returns Return negative, zero or positive number
+ */
+function compareSortKeys(a, b) {
+  if (typeof a !== typeof b) {
+    return typeof a === 'number' ? -1 : 1;
+  }
+  return a < b ? -1 : a > b ? 1 : 0;
+}
+
+// Live update of the report from the json feed
+if (document.body.dataset.feed) {
+  const feed = {
+    name: document.body.dataset.feed,
+    version: Number(document.body.dataset.feedVersion),
+    etag: null,
+    lastModified: null
+  };
+  setInterval(() => pollReportFeed(feed), Number(document.body.dataset.feedInterval) * 1000);
+}
+
+/**
+ * Download delta of the report and patch the changed table rows
+ * @param {Object} feed - name of the feed, version of the shown data and validators of the last response
+ */
+async function pollReportFeed(feed) {
+  const headers = {};
+  if (feed.etag) {
+    headers['If-None-Match'] = feed.etag;
+  }
+  if (feed.lastModified) {
+    headers['If-Modified-Since'] = feed.lastModified;
+  }
+
+  try {
+    const response = await fetch(feed.name + '-delta.json', { headers: headers, cache: 'no-store' });
+    // Not modified since the last poll
+    if (response.status === 304 || !response.ok) {
+      return;
     }
-    if (shouldSwitch) {
-      rows[i].parentNode.insertBefore(rows[i + 1], rows[i]);
-      switching = true;
+    feed.etag = response.headers.get('ETag');
+    feed.lastModified = response.headers.get('Last-Modified');
+
+    const delta = await response.json();
+    if (delta.version === feed.version) {
+      return;
+    }
+
+    let patched;
+    if (delta.version > feed.version && delta.from_version === feed.version) {
+      patched = Object.entries(delta.tables).every(([tableId, table]) =>
+        patchTable(tableId, table, { ...table.added, ...table.changed }, table.removed));
+    } else {
+      // Some versions were missed or the feed started again from version 1 (e.g. the feed file was removed),
+      // compare the whole feed with the page
+      const full = await (await fetch(feed.name + '.json', { cache: 'no-store' })).json();
+      patched = Object.entries(full.tables).every(([tableId, table]) =>
+        patchTable(tableId, table, table.rows, null));
+      delta.version = full.version;
     }
+
+    // Table was emptied or filled for the first time, the page has to be loaded again
+    if (!patched) {
+      location.reload();
+      return;
+    }
+    feed.version = delta.version;
+  } catch (error) {
+    console.log('Report update failed', error);
   }
-}
\ No newline at end of file
+}
+
+/**
+ * Update rows of the table in place, checkbox status and scroll position are kept
+ * @param {String} tableId - id of the table
+ * @param {Object} table - columns of the table and checkbox flag from the feed
+ * @param {Object} rows - added and changed rows, row id -> cell texts and sort keys
+ * @param {Array} removed - ids of the removed rows, null removes all rows not in rows
+ * @returns false when the table can not be patched
+ */
+function patchTable(tableId, table, rows, removed) {
+  const virtual = virtualTables.get(tableId);
+  if (virtual) {
+    return patchVirtualTable(virtual, rows, removed);
+  }
+
+  const element = document.getElementById(tableId);
+  if (!element || element.querySelector('.nodata')) {
+    return Object.keys(rows).length === 0;
+  }
+  const body = element.tBodies[0] || element;
+  const offset = table.checkbox ? 1 : 0;
+
+  // Rows of the table by id
+  const rowsById = new Map();
+  for (const row of [...element.rows]) {
+    if (!row.id) {
+      continue;
+    }
+    if (rowsById.has(row.id)) {
+      // Duplicate id from an older version of the report, the data are in the first row
+      row.remove();
+    } else {
+      rowsById.set(row.id, row);
+    }
+  }
+
+  const removedIds = removed === null
+    ? [...rowsById.keys()].filter((rowId) => !(rowId in rows))
+    : removed;
+  removedIds.forEach((rowId) => {
+    const row = rowsById.get(rowId);
+    if (row) {
+      row.remove();
+      rowsById.delete(rowId);
+    }
+  });
+
+  for (const [rowId, data] of Object.entries(rows)) {
+    let row = rowsById.get(rowId);
+    if (!row) {
+      row = createTableRow(tableId, rowId, table);
+      body.appendChild(row);
+      rowsById.set(rowId, row);
+    }
+    fillTableRow(row, data, offset);
+  }
+
+  return rowsById.size > 0;
+}
+
+/**
+ * Create new empty table row, checkbox has the stored status
+ * @param {String} tableId - id of the table
+ * @param {String} rowId - id of the row
+ * @param {Object} table - columns of the table and checkbox flag
+ * @returns Return new row element
+ */
+function createTableRow(tableId, rowId, table) {
+  const row = document.createElement('tr');
+  row.id = rowId;
+  if (table.checkbox) {
+    const checkbox = document.createElement('input');
+    checkbox.type = 'checkbox';
+    checkbox.className = 'solved';
+    checkbox.checked = loadTableRowStatus(tableId, rowId);
+    row.insertCell().appendChild(checkbox);
+    row.classList.add(checkbox.checked ? 'row-solved' : 'row-unsolved');
+  }
+  table.columns.forEach((column) => {
+    row.insertCell().className = column;
+  });
+  return row;
+}
+
+/**
+ * Set texts and sort keys of the row cells
+ * @param {Element} row - table row
+ * @param {Object} data - cell texts and sort keys
+ * @param {Number} offset - number of cells before the data (checkbox)
+ */
+function fillTableRow(row, data, offset) {
+  data.cells.forEach((text, i) => {
+    const cell = row.cells[i + offset];
+    if (cell.textContent !== text) {
+      cell.textContent = text;
+    }
+    if (i in data.sort) {
+      cell.dataset.sort = data.sort[i];
+    }
+  });
+}
+
+/**
+ * Prepare virtual table - rows are rendered from the json data only in the visible part of the table
+ * @param {Element} table - table with the header row
+ */
+function initVirtualTable(table) {
+  const data = JSON.parse(document.getElementById(table.id + '-rows').textContent);
+  const virtual = {
+    table: table,
+    container: table.closest('.virtual-table'),
+    columns: data.columns,
+    checkbox: data.checkbox,
+    rows: data.rows,
+    rowHeight: VIRTUAL_ROW_HEIGHT,
+    measured: false,
+    start: -1,
+    end: -1,
+    scheduled: false
+  };
+  virtualTables.set(table.id, virtual);
+
+  virtual.container.addEventListener('scroll', () => scheduleVirtualRender(virtual));
+  window.addEventListener('resize', () => scheduleVirtualRender(virtual));
+  renderVirtualTable(virtual, true);
+}
+
+/**
+ * Render virtual table in the next animation frame, more scroll events are handled once
+ * @param {Object} virtual - virtual table
+ */
+function scheduleVirtualRender(virtual) {
+  if (virtual.scheduled) {
+    return;
+  }
+  virtual.scheduled = true;
+  requestAnimationFrame(() => {
+    virtual.scheduled = false;
+    renderVirtualTable(virtual, false);
+  });
+}
+
+/**
+ * Render visible rows of the virtual table, rows outside are replaced by spacers
+ * @param {Object} virtual - virtual table
+ * @param {Boolean} force - render even if the visible rows did not change
+ */
+function renderVirtualTable(virtual, force) {
+  const rows = virtual.rows;
+  const visible = Math.ceil(virtual.container.clientHeight / virtual.rowHeight) + 1;
+  let start = Math.max(0, Math.floor(virtual.container.scrollTop / virtual.rowHeight) - VIRTUAL_OVERSCAN);
+  // Even start keeps the striped background of the rows in place
+  start -= start % 2;
+  const end = Math.min(rows.length, start + visible + 2 * VIRTUAL_OVERSCAN);
+  if (!force && start === virtual.start && end === virtual.end) {
+    return;
+  }
+  virtual.start = start;
+  virtual.end = end;
+
+  const body = virtual.table.tBodies[0];
+  body.querySelectorAll('tr.virtual-row, tr.virtual-spacer').forEach((row) => row.remove());
+
+  const offset = virtual.checkbox ? 1 : 0;
+  const colspan = virtual.columns.length + offset;
+  const fragment = document.createDocumentFragment();
+  fragment.appendChild(createSpacerRow(start * virtual.rowHeight, colspan));
+  for (let i = start; i < end; i++) {
+    const row = createTableRow(virtual.table.id, rows[i].id, virtual);
+    row.classList.add('virtual-row');
+    fillTableRow(row, rows[i], offset);
+    fragment.appendChild(row);
+  }
+  fragment.appendChild(createSpacerRow((rows.length - end) * virtual.rowHeight, colspan));
+  body.appendChild(fragment);
+
+  // Real row height is known after the first render
+  const first = body.querySelector('tr.virtual-row');
+  if (!virtual.measured && first) {
+    virtual.measured = true;
+    const height = first.getBoundingClientRect().height;
+    if (height > 0 && height !== virtual.rowHeight) {
+      virtual.rowHeight = height;
+      renderVirtualTable(virtual, true);
+    }
+  }
+}
+
+/**
+ * Create row which takes place of the rows outside of the visible part
+ * @param {Number} height - height of the row in px
+ * @param {Number} colspan - number of the table columns
+ * @returns Return new row element
+ */
+function createSpacerRow(height, colspan) {
+  const row = document.createElement('tr');
+  row.className = 'virtual-spacer';
+  const cell = row.insertCell();
+  cell.colSpan = colspan;
+  cell.style.height = height + 'px';
+  return row;
+}
+
+/**
+ * Sort data of the virtual table and render it again
+ * @param {Object} virtual - virtual table
+ * @param {Number} columnIndex - columns index (0,1,2,...)
+ */
+function sortVirtualTable(virtual, columnIndex) {
+  const offset = virtual.checkbox ? 1 : 0;
+  const i = columnIndex - offset;
+  const keyedRows = virtual.rows.map((row) => {
+    let key;
+    if (i < 0) {
+      key = loadTableRowStatus(virtual.table.id, row.id) ? 1 : 0;
+    } else {
+      key = toSortKey(i in row.sort ? row.sort[i] : row.cells[i].toLowerCase());
+    }
+    return [key, row];
+  });
+  keyedRows.sort((a, b) => compareSortKeys(a[0], b[0]));
+  virtual.rows = keyedRows.map(([, row]) => row);
+  renderVirtualTable(virtual, true);
+}
+
+/**
+ * Update data of the virtual table and render it again
+ * @param {Object} virtual - virtual table
+ * @param {Object} rows - added and changed rows, row id -> cell texts and sort keys
+ * @param {Array} removed - ids of the removed rows, null removes all rows not in rows
+ * @returns false when the table is empty
+ */
+function patchVirtualTable(virtual, rows, removed) {
+  const removedIds = new Set(removed === null
+    ? virtual.rows.map((row) => row.id).filter((rowId) => !(rowId in rows))
+    : removed);
+  virtual.rows = virtual.rows.filter((row) => !removedIds.has(row.id));
+
+  const rowsById = new Map(virtual.rows.map((row) => [row.id, row]));
+  for (const [rowId, data] of Object.entries(rows)) {
+    const row = rowsById.get(rowId);
+    if (row) {
+      row.cells = data.cells;
+      row.sort = data.sort;
+    } else {
+      virtual.rows.push({ id: rowId, cells: data.cells, sort: data.sort });
+    }
+  }
+
+  renderVirtualTable(virtual, true);
+  return virtual.rows.length > 0;
+}
@@ -1,171 +1,1618 @@
+import os
 import sys
+import html
+import json
+import re
+import time
 import ftplib
+import queue
+import pickle
+import sqlite3
+import operator
+import itertools
+import hashlib
+import cProfile
+import pstats
+import argparse
+import tempfile
+import threading
+import functools
+import contextlib
+import multiprocessing
+import traceback
+import http.server
+import urllib.parse
+import importlib.util
+import types
+import xml.etree.ElementTree as ElementTree
 import yaml
-from typing import Tuple
-from io import StringIO
-from config import ftp_server_credentials
-from datetime import datetime
+from typing import NamedTuple
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 """
 Process report from the mobile app O-checklist and create html report with changes that can be ticked as done
 Usage: All orienteering events with startlist in iof-xml v3.0
 """
 
+# Index file of the local ftp sync cache
+SYNC_CACHE_INDEX = 'index.json'
+
+# Cache of the processed reports, version is changed when the cached data changes
+PARSE_CACHE_VERSION = '3'
+PARSE_CACHE_MAX_BYTES = 50 * 1024 * 1024
+PARSE_CACHE_MAX_AGE = 24 * 3600
+
+# Append-only store of the changes by event, new rows are found by id greater than the last loaded one,
+# changes withdrawn in a newer version of the file get removed_at, version is changed when the schema or the stored
+# changes change
+CHANGE_STORE_VERSION = 3
+CHANGE_STORE_SCHEMA = '''
+    PRAGMA journal_mode = WAL;
+    CREATE TABLE IF NOT EXISTS changes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        event TEXT NOT NULL,
+        runner_key TEXT NOT NULL,
+        change_type TEXT NOT NULL,
+        changed_at TEXT NOT NULL,
+        source TEXT NOT NULL,
+        stored_at REAL NOT NULL,
+        removed_at REAL,
+        change BLOB NOT NULL,
+        UNIQUE (event, source, runner_key, change_type, changed_at)
+    );
+    CREATE INDEX IF NOT EXISTS changes_event_id ON changes (event, id);
+    CREATE TABLE IF NOT EXISTS files (
+        event TEXT NOT NULL,
+        name TEXT NOT NULL,
+        hash TEXT NOT NULL,
+        ok INTEGER NOT NULL,
+        header BLOB NOT NULL,
+        PRIMARY KEY (event, name)
+    );
+'''
+# Opened change stores with the changes loaded so far, key is path to the database
+CHANGE_STORES = {}
+
+# Index of the IOF XML 3.0 startlist, version is changed when the stored index changes
+STARTLIST_INDEX_VERSION = 1
+# Loaded startlist indexes, key is path to the startlist
+STARTLISTS = {}
+
+# libyaml bindings are optional
+YAML_C_LOADER = getattr(yaml, 'CSafeLoader', None)
+
+# Scalars of the O Checklist report which are parsed without yaml
+YAML_INT = re.compile(r'[-+]?(0|[1-9][0-9]*)')
+YAML_FLOAT = re.compile(r'[-+]?[0-9]+\.[0-9]+')
+YAML_TIMESTAMP = re.compile(r'[0-9]{4}-[0-9]{2}-[0-9]{2}T[0-9]{2}:[0-9]{2}:[0-9]{2}(\.[0-9]{3}|\.[0-9]{6})?([-+][0-9]{2}:[0-9]{2})?')
+YAML_PLAIN_STR = re.compile(r'[^\W\d_][\w .-]*')
+YAML_KEY = re.compile(r'[A-Za-z][A-Za-z0-9_]*')
+YAML_RESERVED = {'yes', 'no', 'true', 'false', 'on', 'off', 'null'}
+
+# Types of the changes, keys of the dictionary returned by process_downloaded_yaml
+CHANGE_TYPES = ('dns', 'changed_cards', 'late_starts', 'comments')
+
+# Html templates of the report tables
+TABLE_TEMPLATE = '''
+                    <p class="cat-title">
+                        <span class="category">{title}</span>
+                    </p>
+                    <table id='{table_id}'>                        
+                        {table_data}
+                    </table>
+                '''
+
+# Table with rows rendered by main.js from the json data, only the visible rows are in the page
+VIRTUAL_TABLE_TEMPLATE = '''
+                    <p class="cat-title">
+                        <span class="category">{title}</span>
+                    </p>
+                    <div class='virtual-table'>
+                        <table id='{table_id}' data-virtual='true'>
+                            {table_header}
+                        </table>
+                    </div>
+                    <script type='application/json' id='{table_id}-rows'>{table_data}</script>
+                '''
+
+# Row of the change, title shows files (devices) which reported the change
+CHANGE_ROW = '''            
+            <tr id='{row_id}' title='{sources}'>
+                <!-- <td class='id'>{runner_id}</td> -->
+                <td><input type="checkbox" class="solved"></td>
+                <td class='timestamp' data-sort='{changed_at_key}'>{changed_at}</td>
+                <td class='starttime' data-sort='{start_time_key}'>{start_time}</td>
+                <td class='name'>{name}</td>
+                <td class='class'>{class_name}</td>
+                <td class='club'>{club}</td>
+                <td class='card' data-sort='{card_key}'>{card}</td>{extra_cells}
+            </tr>
+            '''
+
+# Values of the row templates, in the order they are passed to the compiled template
+ROW_FIELDS = ('row_id', 'sources', 'runner_id', 'changed_at', 'start_time', 'name', 'class_name', 'club', 'card',
+              'value', 'changed_at_key', 'start_time_key', 'card_key', 'value_key')
+
+def compile_row_template(template):
+    """
+    Convert row template with named fields to positional %-template, which is several times faster than str.format
+    :param template: row template with fields from ROW_FIELDS
+    :return: list with %-template and function picking the used values (in ROW_FIELDS order) for it
+    """
+    fields = re.findall(r'\{(\w+)\}', template)
+    positional = re.sub(r'\{(\w+)\}', '%s', template.replace('%', '%%'))
+    return [positional, operator.itemgetter(*[ROW_FIELDS.index(field) for field in fields])]
+
+def table_header(table_id, columns):
+    """
+    Create header row of the report table
+    :param table_id: id of the table
+    :param columns: list of lists with css class and label of the column
+    :return: html of the header row
+    """
+    cells = ''.join(f'''
+                    <th onclick="sortTable({i}, '{table_id}')" class='{css_class}'>{label}</th>'''
+                    for i, (css_class, label) in enumerate(columns))
+    return f'''
+                <tr>
+                    <!-- <th class='id'>Id</th> -->{cells}
+                </tr>
+                '''
+
+def table_empty(colspan, message):
+    """
+    Create row of the empty report table
+    """
+    return f'''
+        <tr>
+            <td class='nodata' colspan='{colspan}'>{message}</td>
+        </tr>
+        '''
+
+CHANGE_COLUMNS = [['solved', 'Vyřešeno'], ['timestamp', 'Čas změny'], ['starttime', 'Star. čas'],
+                  ['name', 'Jméno'], ['class', 'Kategorie'], ['club', 'Klub']]
+
+# Tables of the report by change type
+REPORT_TABLES = {
+    'dns': {
+        'id': 'dataDNS',
+        'title': 'Přehled neběžících závodníků a závodnic',
+        'header': table_header('dataDNS', CHANGE_COLUMNS + [['card', 'Čip']]),
+        'columns': ['timestamp', 'starttime', 'name', 'class', 'club', 'card'],
+        'empty': table_empty(4, 'Žadní neběžící závodníci a závodnice.'),
+        'row': compile_row_template(CHANGE_ROW.replace('{extra_cells}', ''))
+    },
+    'changed_cards': {
+        'id': 'dataCards',
+        'title': 'Přehled změn čipů',
+        'header': table_header('dataCards', CHANGE_COLUMNS + [['oldcard', 'Starý čip'], ['card', 'Nový čip']]),
+        'columns': ['timestamp', 'starttime', 'name', 'class', 'club', 'oldcard', 'card'],
+        'empty': table_empty(5, 'Žadné změny čipů.'),
+        'row': compile_row_template(CHANGE_ROW.replace(
+            "<td class='card' data-sort='{card_key}'>{card}</td>{extra_cells}",
+            "<td class='oldcard' data-sort='{card_key}'>{card}</td>\n"
+            "                <td class='card' data-sort='{value_key}'>{value}</td>"))
+    },
+    'late_starts': {
+        'id': 'dataLateStart',
+        'title': 'Přehled opožděných startů',
+        'header': table_header('dataLateStart', CHANGE_COLUMNS + [['card', 'Čip']]),
+        'columns': ['timestamp', 'starttime', 'name', 'class', 'club', 'card'],
+        'empty': table_empty(4, 'Žadné opožděné starty.'),
+        'row': compile_row_template(CHANGE_ROW.replace('{extra_cells}', ''))
+    },
+    'comments': {
+        'id': 'dataComments',
+        'title': 'Přehled komentářů od startérů',
+        'header': table_header('dataComments', CHANGE_COLUMNS + [['card', 'Čip'], ['comment', 'Komentář']]),
+        'columns': ['timestamp', 'starttime', 'name', 'class', 'club', 'card', 'comment'],
+        'empty': table_empty(5, 'Žádné nové komentáře.'),
+        'row': compile_row_template(CHANGE_ROW.replace('{extra_cells}', "\n                <td class='comment'>{value}</td>"))
+    }
+}
+
+STATISTICS_TEMPLATE = TABLE_TEMPLATE.format(table_id='dataStatistics', title='Statistiky', table_data='{table_data}')
+STATISTICS_HEADER = table_header('dataStatistics', [
+    ['filename', 'Název souboru'], ['created', 'Datum vytvoření'], ['creator', 'Verze aplikace'],
+    ['version', 'Verze reportu'], ['ok', 'OK'], ['dns', 'DNS'], ['new-cards', 'New cards'],
+    ['late-starts', 'Late starts'], ['new-comments', 'New comments']]).replace("\n                    <!-- <th class='id'>Id</th> -->", '')
+STATISTICS_EMPTY = table_empty(5, 'Žádné statistiky.')
+STATISTICS_COLUMNS = ['file', 'created', 'creator', 'version', 'ok', 'dns', 'new-cards', 'late-starts', 'new-comments']
+STATISTICS_ROW = '''            
+                <tr id='{row_id}'>{cells}
+                </tr>
+                '''
+STATISTICS_CELL = '''
+                    <td class='{css_class}'>{value}</td>'''
+
+# Hash of the report content in the html head
+REPORT_HASH = re.compile(r'<meta name="report-hash" content="([0-9a-f]+)">')
+REPORT_HASH_LOOKUP = 4096
+
+# Shared solved state - number of changes kept for incremental sync, max seconds of one long poll and max request size
+SOLVED_SYNC_LOG = 1000
+SOLVED_SYNC_WAIT = 25
+SOLVED_SYNC_MAX_BODY = 64 * 1024
+
+# Metrics of the current run - stage timings and counters, written after the run by write_metrics
+METRICS = {}
+METRICS_LOCK = threading.Lock()
+METRICS_PREFIX = 'ochecklist_'
+# Counters written also when they stay zero, so the metrics of the runs are comparable
+METRICS_COUNTERS = ('downloaded_bytes', 'files_listed', 'files_downloaded', 'sync_cache_hits', 'files_processed',
+                    'files_parsed', 'parse_cache_hits', 'change_store_hits', 'rows_rendered', 'row_cache_hits')
+
+# Rendered rows of the previous run, key is table id and Change
+ROW_CACHE = {}
+HTML_SPECIAL = re.compile('[&<>"\']')
+
+class Change(NamedTuple):
+    """
+    Change of one runner reported by O Checklist
+    """
+    runner_id: str
+    start_time: datetime
+    changed_at: datetime
+    name: str
+    class_name: str
+    club: str
+    card: object
+    # New card or comment
+    value: object = None
+    # Files (devices) which reported the change
+    sources: tuple = ()
+
 def main() -> None:
-    downloaded_file = download_file_from_ftp(**ftp_server_credentials)
-    changes = process_downloaded_yaml(downloaded_file)
-    generate_html_report(changes)
+    args = parse_args()
+    config = load_config(args.config)
 
-def download_file_from_ftp(server, login, password, subfolder='/'):
+    # One run under the profiler
+    if args.profile:
+        profile_run(config, args.profile, args.event_id)
+        return
+
+    # Shared solved state for more operator stations
+    sync_server = sync_url = None
+    if args.sync:
+        sync_settings = dict(getattr(config, 'solved_sync', {}))
+        sync_url = sync_settings.pop('url', None)
+        sync_server = create_sync_server(**sync_settings)
+        sync_url = sync_url or str(sync_server.server_address[1])
+        print(f"Solved state sync on port {sync_server.server_address[1]}")
+        threading.Thread(target=sync_server.serve_forever, daemon=True).start()
+
+    failed = 0
+    try:
+        events = getattr(config, 'events', None)
+        if events:
+            failed = run_events(args.config, len(events), getattr(config, 'event_workers', None), args.daemon,
+                                args.interval, args.keepalive, sync_url)
+        elif args.daemon:
+            run_daemon(config, args.interval, args.keepalive, args.event_id, sync_url)
+        else:
+            downloaded_file = download_file_from_ftp(**config.ftp_server_credentials)
+            run_pipeline(downloaded_file, config, event_id=args.event_id, sync_url=sync_url)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if sync_server is not None:
+            sync_server.server_close()
+
+    # Failed events are reported by the exit code, e.g. to the Task Scheduler
+    if failed:
+        sys.exit(f"{failed} of {len(events)} events failed")
+
+def run_pipeline(downloaded_files, config=None, report_name='online-report', event_id=None, sync_url=None):
     """
-    Get file from ftp server
+    Process downloaded files and render the html report
+    :param downloaded_files: list of lists with filename and contents of downloaded yaml files
+    :param config: loaded config module, optional settings are read from it
+    :param report_name: name of the html report
+    :param event_id: id of the event, solved rows in the browser are stored under it (optional)
+    :param sync_url: url or port of the solved state sync server (optional)
+    """
+    with measure_stage('process'):
+        changes = process_downloaded_yaml(downloaded_files, getattr(config, 'yaml_loader', 'auto'),
+                                          store=getattr(config, 'change_store', None),
+                                          startlist=getattr(config, 'startlist', None), event_id=event_id,
+                                          **getattr(config, 'parse_cache', {}))
+
+    # Json feed for live update of the opened report
+    feed = None
+    feed_interval = getattr(config, 'json_feed_interval', None)
+    if feed_interval:
+        with measure_stage('feed'):
+            feed = {'version': generate_json_feed(changes, report_name), 'interval': feed_interval}
+
+    with measure_stage('render'):
+        generate_html_report(changes, report_name, feed, getattr(config, 'virtual_table_rows', None), event_id,
+                             sync_url)
+
+    # Metrics of the run, download is measured in download_files
+    metrics_formats = getattr(config, 'metrics_formats', None)
+    if metrics_formats:
+        write_metrics(report_name, metrics_formats)
+
+def run_daemon(config, interval=30, keepalive=60, event_id=None, sync_url=None, report_name='online-report'):
+    """
+    Poll the ftp server in regular intervals over one persistent connection and refresh the report
+    :param config: loaded config module
+    :param interval: seconds between two polls
+    :param keepalive: max seconds between two commands sent to the idle connection
+    :param event_id: id of the event (optional)
+    :param sync_url: url or port of the solved state sync server (optional)
+    :param report_name: name of the html report
+    """
+    credentials = dict(config.ftp_server_credentials)
+    cache_dir = credentials.pop('cache_dir', None)
+    pool_size = credentials.pop('pool_size', 1)
+    connect = functools.partial(connect_ftp, **credentials)
+    ftp = None
+    # Idle connections of the parallel downloads, kept open between the polls too
+    connections = queue.LifoQueue()
+
+    try:
+        while True:
+            next_poll = time.monotonic() + interval
+            downloaded_files = None
+            try:
+                # Connection lost while waiting - reconnect before the poll
+                if ftp is not None and not send_keepalive(ftp):
+                    ftp = None
+                if ftp is None:
+                    ftp = connect()
+                # Broken idle connections are dropped, new ones are opened by the download
+                keep_connections_alive(connections)
+
+                downloaded_files = download_files(ftp, cache_dir, connect, pool_size, credentials.get('timeout'),
+                                                  connections)
+            except ftplib.all_errors as e:
+                print(f"FTP error: {e}, reconnecting in next poll", file=sys.stderr)
+                close_ftp(ftp)
+                ftp = None
+            except Exception:
+                traceback.print_exc()
+
+            # Errors of the processing (also disk errors) keep the healthy connection
+            if downloaded_files is not None:
+                try:
+                    run_pipeline(downloaded_files, config, report_name, event_id, sync_url)
+                except Exception:
+                    # Broken report must not stop the daemon
+                    traceback.print_exc()
+
+            # Wait for the next poll and keep the connection alive
+            while True:
+                remaining = next_poll - time.monotonic()
+                if remaining <= 0:
+                    break
+                time.sleep(min(remaining, keepalive))
+                if next_poll - time.monotonic() > 0:
+                    if ftp is not None and not send_keepalive(ftp):
+                        ftp = None
+                    keep_connections_alive(connections)
+    finally:
+        close_ftp(ftp)
+        close_connections(connections)
+
+def run_events(config_path, count, workers=None, daemon=False, interval=30, keepalive=60, sync_url=None):
+    """
+    Run pipelines of more events from the events list in config.py, each event in its own process
+    so a slow or failing event does not delay the others
+    :param config_path: path to config.py, it is loaded again in the worker processes
+    :param count: number of the events
+    :param workers: max number of the worker processes, in daemon mode each event has its own process
+    :param daemon: keep refreshing the reports, see run_daemon
+    :param interval: seconds between two polls in daemon mode
+    :param keepalive: max seconds between two commands sent to the idle connection in daemon mode
+    :param sync_url: url or port of the solved state sync server (optional)
+    :return: number of the failed events
+    """
+    failed = 0
+    run = functools.partial(run_event, config_path, daemon=daemon, interval=interval, keepalive=keepalive,
+                            sync_url=sync_url)
+    # Workers are terminated when the pool is left, also by Ctrl+C in daemon mode
+    with multiprocessing.Pool(count if daemon else min(workers or count, count)) as pool:
+        for event_id, error in pool.imap_unordered(run, range(count)):
+            if error is None:
+                print(f"Event {event_id} done")
+            else:
+                failed += 1
+                print(f"Event {event_id} failed:\n{error}", file=sys.stderr)
+    return failed
+
+def run_event(config_path, position, daemon=False, interval=30, keepalive=60, sync_url=None):
+    """
+    Download, process and render report of one event, runs in a worker process
+    :param config_path: path to config.py
+    :param position: position of the event in the events list
+    :return: event id and traceback of the failure or None
+    """
+    event_id = position + 1
+    try:
+        event = event_config(load_config(config_path), position)
+        event_id = event.event_id
+        if daemon:
+            run_daemon(event, interval, keepalive, event.event_id, sync_url, event.report_name)
+        else:
+            downloaded_files = download_file_from_ftp(**event.ftp_server_credentials)
+            run_pipeline(downloaded_files, event, event.report_name, event.event_id, sync_url)
+    except KeyboardInterrupt:
+        pass
+    except Exception:
+        # Failure of one event does not stop the others
+        return event_id, traceback.format_exc()
+    return event_id, None
+
+def event_config(config, position):
+    """
+    Settings of one event - values from the event dictionary override the common ones from config.py
+    :param config: loaded config module
+    :param position: position of the event in the events list
+    :return: namespace with the same attributes as config.py
+    """
+    settings = {name: value for name, value in vars(config).items()
+                if not name.startswith('_') and not isinstance(value, types.ModuleType) and name != 'events'}
+    event = dict(config.events[position])
+    event_id = event['event_id'] = str(event.get('event_id', position + 1))
+    event.setdefault('report_name', f'online-report-{event_id}')
+
+    # Caches with the state of one event can not be shared
+    credentials = dict(event.get('ftp_server_credentials', settings.get('ftp_server_credentials', {})))
+    if credentials.get('cache_dir'):
+        credentials['cache_dir'] = os.path.join(credentials['cache_dir'], event_id)
+    event['ftp_server_credentials'] = credentials
+    if 'change_store' not in event and settings.get('change_store'):
+        root, extension = os.path.splitext(settings['change_store'])
+        event['change_store'] = f'{root}-{event_id}{extension}'
+
+    settings.update(event)
+    return types.SimpleNamespace(**settings)
+
+def connect_ftp(server, login, password, subfolder='/', timeout=None, port=21):
+    """
+    Connect and login to the ftp server
     :param server: ftp server
     :param login: Username
     :param password: password
     :param subfolder: downloaded file location
-    :return: list of list wirh filename and downloaded file content
+    :param timeout: socket timeout in seconds (optional)
+    :param port: port of the ftp server
+    :return: connected ftplib.FTP object
     """
-
-    downloaded_files = []
     # Connect to the FTP server
-    ftp = ftplib.FTP(server, login, password)
+    ftp = ftplib.FTP(timeout=timeout)
+    try:
+        ftp.connect(server, port)
+        ftp.login(login, password)
+    except BaseException:
+        ftp.close()
+        raise
 
     # Change to the directory where the file is located (if necessary)
     ftp.cwd(subfolder)
 
-    # Download the file from the FTP server and write it to the StringIO object
-    def write_file_data(data):
-        downloaded_file.write(data.decode('utf-8'))
+    return ftp
+
+def send_keepalive(ftp):
+    """
+    Send NOOP to the idle connection
+    :param ftp: connected ftplib.FTP object
+    :return: False when the connection is broken (and was closed)
+    """
+    # Closed after a failed transfer
+    if ftp.sock is None:
+        return False
+    try:
+        ftp.voidcmd('NOOP')
+        return True
+    except ftplib.all_errors:
+        close_ftp(ftp)
+        return False
+
+def keep_connections_alive(connections):
+    """
+    Send NOOP to the idle connections, broken ones are dropped
+    :param connections: queue.LifoQueue with idle ftplib.FTP objects
+    """
+    alive = []
+    while not connections.empty():
+        ftp = connections.get_nowait()
+        if send_keepalive(ftp):
+            alive.append(ftp)
+    for ftp in reversed(alive):
+        connections.put(ftp)
+
+def close_connections(connections):
+    """
+    Close all idle connections
+    :param connections: queue.LifoQueue with idle ftplib.FTP objects
+    """
+    while not connections.empty():
+        close_ftp(connections.get_nowait())
+
+def close_ftp(ftp):
+    """
+    Close the ftp connection, errors are ignored
+    :param ftp: ftplib.FTP object or None
+    """
+    if ftp is None or ftp.sock is None:
+        return
+    try:
+        ftp.quit()
+    except ftplib.all_errors:
+        ftp.close()
+
+def download_file_from_ftp(server, login, password, subfolder='/', cache_dir=None, pool_size=1, timeout=None,
+                           port=21):
+    """
+    Get file from ftp server
+    :param server: ftp server
+    :param login: Username
+    :param password: password
+    :param subfolder: downloaded file location
+    :param cache_dir: local folder for the sync cache, unchanged files are not downloaded again (optional)
+    :param pool_size: number of parallel ftp connections used for downloading
+    :param timeout: max seconds for the download of one file (optional)
+    :param port: port of the ftp server
+    :return: list of list wirh filename and downloaded file content
+    """
+    connect = functools.partial(connect_ftp, server, login, password, subfolder, timeout, port)
+    ftp = connect()
+    try:
+        return download_files(ftp, cache_dir, connect, pool_size, timeout)
+    finally:
+        # Close the FTP connection
+        close_ftp(ftp)
+
+def download_files(ftp, cache_dir=None, connect=None, pool_size=1, timeout=None, connections=None):
+    """
+    Get all yaml files from the current directory of the ftp connection
+    :param ftp: connected ftplib.FTP object
+    :param cache_dir: local folder for the sync cache, unchanged files are not downloaded again (optional)
+    :param connect: function returning new connection, used for parallel downloads (optional)
+    :param pool_size: number of parallel ftp connections used for downloading
+    :param timeout: max seconds for the download of one file (optional)
+    :param connections: queue.LifoQueue with idle connections for parallel downloads, the connections are left open
+                        for the next call (optional)
+    :return: list of list wirh filename and downloaded file content
+    """
+    # Download starts a new run
+    reset_metrics()
+    with measure_stage('download'):
+        return download_listed_files(ftp, cache_dir, connect, pool_size, timeout, connections)
+
+def download_listed_files(ftp, cache_dir=None, connect=None, pool_size=1, timeout=None, connections=None):
+    """
+    Get all yaml files from the current directory of the ftp connection, see download_files
+    """
+    contents = {}
+    to_download = []
+
+    # Size and modification time are only reliable in binary mode
+    ftp.voidcmd('TYPE I')
+
+    # Files downloaded in the previous runs
+    sync_cache = load_sync_cache(cache_dir) if cache_dir is not None else {}
+    new_sync_cache = {}
 
     # Get a list of all YAML files in the directory
     filenames = ftp.nlst('*.yaml')
     for filename in filenames:
-        # Create a StringIO object to hold the contents of the downloaded file
-        downloaded_file = StringIO()
+        fingerprint = get_remote_fingerprint(ftp, filename) if cache_dir is not None else None
+        cached = sync_cache.get(filename)
 
-        # Download the file
-        ftp.retrbinary('RETR ' + filename, write_file_data)
+        # Unchanged file - use the local copy
+        if fingerprint is not None and cached is not None and cached['fingerprint'] == fingerprint:
+            content = read_cached_file(cache_dir, cached['path'])
+            if content is not None:
+                new_sync_cache[filename] = cached
+                contents[filename] = content
+                add_metric('sync_cache_hits')
+                continue
 
-        # Retrieve the contents of the StringIO object as a string
-        downloaded_files.append([filename, downloaded_file.getvalue()])
+        to_download.append([filename, fingerprint])
 
-    # Close the FTP connection
-    ftp.quit()
+    # Download new and changed files
+    if connect is not None and pool_size > 1 and len(to_download) > 1:
+        downloaded = fetch_files_parallel([filename for filename, _ in to_download], connect, pool_size, timeout,
+                                          connections)
+    else:
+        downloaded = fetch_files_sequential(ftp, [filename for filename, _ in to_download], connect, timeout)
+
+    for filename, fingerprint in to_download:
+        content = downloaded.get(filename)
+        if content is None:
+            # Failed download - use the previous version of the file if there is any,
+            # the old fingerprint is kept so it is downloaded again in the next run
+            cached = sync_cache.get(filename)
+            content = read_cached_file(cache_dir, cached['path']) if cached is not None else None
+            if content is None:
+                continue
+            new_sync_cache[filename] = cached
+        elif fingerprint is not None:
+            new_sync_cache[filename] = store_cached_file(cache_dir, filename, fingerprint, content)
+        contents[filename] = content
+
+    # Files removed from the server are dropped from the cache
+    if cache_dir is not None:
+        save_sync_cache(cache_dir, new_sync_cache, sync_cache)
+
+    add_metric('files_listed', len(filenames))
+    add_metric('files_downloaded', len(downloaded))
+
+    # Keep the order of the files on the server
+    return [[filename, contents[filename]] for filename in filenames if filename in contents]
+
+def fetch_file(ftp, filename, timeout=None):
+    """
+    Download one file
+    :param ftp: connected ftplib.FTP object
+    :param filename: remote file name
+    :param timeout: max seconds for the download (optional)
+    :return: file content
+    """
+    chunks = []
+    deadline = time.monotonic() + timeout if timeout is not None else None
+
+    # Download the file from the FTP server, slow transfer is aborted after the deadline
+    def write_file_data(data):
+        if deadline is not None and time.monotonic() > deadline:
+            raise TimeoutError(f"download took more than {timeout} s")
+        chunks.append(data)
+
+    ftp.retrbinary('RETR ' + filename, write_file_data)
+
+    # Decode whole file at once, utf-8 characters can be split between the chunks
+    data = b''.join(chunks)
+    add_metric('downloaded_bytes', len(data))
+    return data.decode('utf-8')
+
+def fetch_files_sequential(ftp, filenames, connect=None, timeout=None):
+    """
+    Download files one by one over the connection
+    :param ftp: connected ftplib.FTP object, it is closed when a transfer fails
+    :param filenames: remote file names
+    :param connect: function returning new connection for the rest of the files after failed transfer (optional)
+    :param timeout: max seconds for the download of one file (optional)
+    :return: dictionary filename -> content, failed downloads are missing
+    """
+    downloaded = {}
+    connection = ftp
+    try:
+        for filename in filenames:
+            if connection is None:
+                try:
+                    connection = connect()
+                except ftplib.all_errors as e:
+                    # Rest of the files is used from the cache
+                    print(f"Reconnect failed: {e}", file=sys.stderr)
+                    break
+            try:
+                downloaded[filename] = fetch_file(connection, filename, timeout)
+            except ftplib.error_perm as e:
+                # File removed after the listing, the connection is still usable
+                print(f"Download of {filename} failed: {e}", file=sys.stderr)
+            except ftplib.all_errors as e:
+                print(f"Download of {filename} failed: {e}", file=sys.stderr)
+                # Connection state is unknown after failed transfer
+                close_ftp(connection)
+                connection = None
+                if connect is None:
+                    break
+    finally:
+        if connection is not ftp:
+            close_ftp(connection)
+    return downloaded
+
+def fetch_files_parallel(filenames, connect, pool_size, timeout=None, connections=None):
+    """
+    Download files over a bounded pool of ftp connections
+    :param filenames: remote file names
+    :param connect: function returning new connection
+    :param pool_size: max number of parallel connections
+    :param timeout: max seconds for the download of one file (optional)
+    :param connections: queue.LifoQueue with idle connections, they are left open for the next call (optional)
+    :return: dictionary filename -> content, failed downloads are missing
+    """
+    # Idle connections, new one is opened only when all are busy
+    keep_open = connections is not None
+    if connections is None:
+        connections = queue.LifoQueue()
+
+    def fetch(filename):
+        try:
+            ftp = connections.get_nowait()
+        except queue.Empty:
+            ftp = connect()
+        try:
+            content = fetch_file(ftp, filename, timeout)
+        except BaseException:
+            # Connection state is unknown after failed transfer
+            close_ftp(ftp)
+            raise
+        connections.put(ftp)
+        return content
+
+    downloaded = {}
+    with ThreadPoolExecutor(max_workers=min(pool_size, len(filenames))) as executor:
+        futures = {executor.submit(fetch, filename): filename for filename in filenames}
+        for future in as_completed(futures):
+            filename = futures[future]
+            try:
+                downloaded[filename] = future.result()
+            except Exception as e:
+                # One failed file must not stop the others
+                print(f"Download of {filename} failed: {e}", file=sys.stderr)
+
+    # Pool is never larger than pool_size, also when pool_size was lowered
+    while connections.qsize() > (pool_size if keep_open else 0):
+        close_ftp(connections.get_nowait())
+
+    return downloaded
+
+def get_remote_fingerprint(ftp, filename):
+    """
+    Get size and modification time of the file on the ftp server
+    :param ftp: connected ftplib.FTP object
+    :param filename: remote file name
+    :return: list with size and MDTM value or None when the server does not support SIZE/MDTM
+    """
+    try:
+        size = ftp.size(filename)
+        modified = ftp.sendcmd('MDTM ' + filename)[4:].strip()
+    except ftplib.error_perm:
+        return None
+    return [size, modified]
+
+def load_sync_cache(cache_dir):
+    """
+    Load index of the files downloaded in the previous runs
+    :param cache_dir: local cache folder
+    :return: dictionary filename -> {'fingerprint': [size, mdtm], 'path': local file name}
+    """
+    try:
+        with open(os.path.join(cache_dir, SYNC_CACHE_INDEX), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_sync_cache(cache_dir, sync_cache, old_sync_cache):
+    """
+    Store index of the downloaded files and remove local copies which are not used anymore
+    :param cache_dir: local cache folder
+    :param sync_cache: index of the files downloaded in this run
+    :param old_sync_cache: index loaded at the start of this run
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(os.path.join(cache_dir, SYNC_CACHE_INDEX), 'w', encoding='utf-8') as f:
+        json.dump(sync_cache, f, indent=2)
+
+    used_paths = {entry['path'] for entry in sync_cache.values()}
+    for entry in old_sync_cache.values():
+        if entry['path'] not in used_paths:
+            try:
+                os.remove(os.path.join(cache_dir, entry['path']))
+            except OSError:
+                pass
+
+def read_cached_file(cache_dir, path):
+    """
+    Read local copy of the downloaded file
+    :return: file content or None when the local copy is missing
+    """
+    try:
+        # Line endings are kept, content must be same as the downloaded one
+        with open(os.path.join(cache_dir, path), encoding='utf-8', newline='') as f:
+            return f.read()
+    except OSError:
+        return None
+
+def store_cached_file(cache_dir, filename, fingerprint, content):
+    """
+    Store local copy of the downloaded file
+    :return: sync cache entry for the file
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    path = hashlib.sha1(filename.encode('utf-8')).hexdigest() + '.yaml'
+    with open(os.path.join(cache_dir, path), 'w', encoding='utf-8', newline='') as f:
+        f.write(content)
+    return {'fingerprint': fingerprint, 'path': path}
+
+def load_report(content, loader='auto'):
+    """
+    Load O Checklist report
+    :param content: yaml file content
+    :param loader: 'auto' - dedicated O Checklist parser with fallback to yaml,
+                   'ochecklist' - same as auto,
+                   'libyaml' - yaml with libyaml (if available),
+                   'python' - pure python yaml.safe_load
+    :return: loaded report
+    """
+    if loader in ('auto', 'ochecklist'):
+        try:
+            return parse_ochecklist_report(content)
+        except ValueError:
+            # Report is not in the expected shape, leave it to yaml
+            pass
+    if loader != 'python' and YAML_C_LOADER is not None:
+        return yaml.load(content, Loader=YAML_C_LOADER)
+    return yaml.safe_load(content)
+
+def iter_report_runners(content, header, loader='auto'):
+    """
+    Stream O Checklist report - yields entries of the Data list one by one, whole report is never loaded at once
+    :param content: yaml file content
+    :param header: dictionary, filled with the other top level values (Version, Creator, Created)
+    :param loader: yaml loader, see load_report
+    :return: generator of the Data entries
+    """
+    yielded = 0
+    if loader in ('auto', 'ochecklist'):
+        try:
+            for runner in iter_ochecklist_report(content, header):
+                yield runner
+                yielded += 1
+            return
+        except ValueError:
+            # Report is not in the expected shape, continue with yaml after the already processed entries
+            header.clear()
+
+    loader_class = YAML_C_LOADER if loader != 'python' and YAML_C_LOADER is not None else yaml.SafeLoader
+    for i, runner in enumerate(iter_yaml_report(content, header, loader_class)):
+        if i >= yielded:
+            yield runner
+
+def iter_yaml_report(content, header, loader_class=yaml.SafeLoader):
+    """
+    Stream the report from the yaml event stream, only one Data entry is constructed at a time
+    :param content: yaml file content
+    :param header: dictionary, filled with the other top level values
+    :param loader_class: yaml loader class
+    :return: generator of the Data entries
+    """
+    loader = loader_class(content)
+    anchors = {}
+    try:
+        loader.get_event()
+        if loader.check_event(yaml.StreamEndEvent):
+            return
+        loader.get_event()
+        if not loader.check_event(yaml.MappingStartEvent):
+            raise ValueError('report is not a mapping')
+        loader.get_event()
+
+        while not loader.check_event(yaml.MappingEndEvent):
+            key = loader.construct_document(compose_yaml_node(loader, anchors))
+            if key == 'Data' and loader.check_event(yaml.SequenceStartEvent):
+                loader.get_event()
+                while not loader.check_event(yaml.SequenceEndEvent):
+                    yield loader.construct_document(compose_yaml_node(loader, anchors))
+                loader.get_event()
+            else:
+                header[key] = loader.construct_document(compose_yaml_node(loader, anchors))
+    finally:
+        loader.dispose()
+
+def compose_yaml_node(loader, anchors):
+    """
+    Compose yaml node from the events of the loader, works for both pure python and libyaml loader
+    :param loader: yaml loader
+    :param anchors: dictionary of the already composed anchored nodes
+    :return: yaml node
+    """
+    event = loader.get_event()
+    if isinstance(event, yaml.AliasEvent):
+        return anchors[event.anchor]
+
+    if isinstance(event, yaml.ScalarEvent):
+        tag = event.tag
+        if tag is None or tag == '!':
+            tag = loader.resolve(yaml.ScalarNode, event.value, event.implicit)
+        node = yaml.ScalarNode(tag, event.value, event.start_mark, event.end_mark, style=event.style)
+    elif isinstance(event, yaml.SequenceStartEvent):
+        tag = event.tag
+        if tag is None or tag == '!':
+            tag = loader.resolve(yaml.SequenceNode, None, event.implicit)
+        node = yaml.SequenceNode(tag, [], event.start_mark, None, flow_style=event.flow_style)
+        while not loader.check_event(yaml.SequenceEndEvent):
+            node.value.append(compose_yaml_node(loader, anchors))
+        node.end_mark = loader.get_event().end_mark
+    elif isinstance(event, yaml.MappingStartEvent):
+        tag = event.tag
+        if tag is None or tag == '!':
+            tag = loader.resolve(yaml.MappingNode, None, event.implicit)
+        node = yaml.MappingNode(tag, [], event.start_mark, None, flow_style=event.flow_style)
+        while not loader.check_event(yaml.MappingEndEvent):
+            node.value.append((compose_yaml_node(loader, anchors), compose_yaml_node(loader, anchors)))
+        node.end_mark = loader.get_event().end_mark
+    else:
+        raise ValueError(f'unexpected yaml event {event}')
+
+    if event.anchor is not None:
+        anchors[event.anchor] = node
+    return node
+
+def parse_ochecklist_report(content):
+    """
+    Parse the flat report exported by O Checklist without generic yaml construction.
+    :param content: yaml file content
+    :return: loaded report, same as from yaml.safe_load
+    :raise ValueError: report is not in the expected shape
+    """
+    report = {}
+    data = list(iter_ochecklist_report(content, report))
+    if 'Data' not in report:
+        raise ValueError('missing Data')
+    report['Data'] = data
+    return report
+
+def iter_ochecklist_report(content, header):
+    """
+    Stream the flat report exported by O Checklist without generic yaml construction.
+    Only the known shape is accepted: top level scalars and Data list of Runner/ChangeLog mappings.
+    Data entry is yielded once it is complete, Data itself is stored into the header as None.
+    :param content: yaml file content
+    :param header: dictionary, filled with the other top level values
+    :return: generator of the Data entries
+    :raise ValueError: report is not in the expected shape
+    """
+    in_data = False
+    item = None
+    item_indent = None
+    block = None
+    block_indent = None
+
+    for line in iter_lines(content):
+        line = line.rstrip('\r')
+        text = line.lstrip(' ')
+        if text == '' or text.startswith('#'):
+            continue
+        indent = len(line) - len(text)
+
+        # Top level values
+        if indent == 0:
+            if text == '---' and not header:
+                continue
+            key, value = split_yaml_line(text)
+            if item is not None:
+                yield item
+                item = block = None
+            if key == 'Data':
+                if value != '':
+                    raise ValueError('Data is not a list')
+                header[key] = None
+                in_data = True
+            else:
+                header[key] = parse_yaml_scalar(value)
+                in_data = False
+            continue
 
-    return downloaded_files
+        # New item of the Data list
+        if text.startswith('- '):
+            if not in_data or (item_indent is not None and indent + 2 != item_indent):
+                raise ValueError('unexpected list item')
+            if item is not None:
+                yield item
+            item = {}
+            item_indent = indent + 2
+            text = text[2:].lstrip(' ')
+            indent = len(line) - len(text)
+            if indent != item_indent:
+                raise ValueError('unexpected list item')
 
-def process_downloaded_yaml(downloaded_files):
+        if item is None:
+            raise ValueError('unexpected indentation')
+
+        key, value = split_yaml_line(text)
+
+        # Runner or ChangeLog mapping
+        if indent == item_indent:
+            if value == '':
+                block = {}
+                block_indent = None
+            elif value == 'null' or value == '~':
+                block = None
+            else:
+                raise ValueError(f'unexpected value of {key}')
+            item[key] = block
+        # Values of the Runner or ChangeLog
+        elif block is not None and indent > item_indent and (block_indent is None or indent == block_indent):
+            block_indent = indent
+            block[key] = parse_yaml_scalar(value)
+        else:
+            raise ValueError('unexpected indentation')
+
+    if item is not None:
+        yield item
+
+def iter_lines(content):
+    """
+    Iterate over lines of the string without splitting it all at once
+    """
+    start = 0
+    while start < len(content):
+        end = content.find('\n', start)
+        if end == -1:
+            end = len(content)
+        yield content[start:end]
+        start = end + 1
+
+def split_yaml_line(text):
+    """
+    Split yaml line to key and raw value
+    :raise ValueError: line is not a simple key: value pair
+    """
+    key, separator, value = text.partition(':')
+    if not separator or (value and value[0] != ' ') or not YAML_KEY.fullmatch(key):
+        raise ValueError(f'unexpected line {text}')
+    return key, value.strip(' ')
+
+def parse_yaml_scalar(value):
+    """
+    Convert raw yaml scalar to python value, the same way as yaml.safe_load
+    """
+    if value == '' or value == '~':
+        return None
+    if len(value) > 1 and value[0] == value[-1] == '"' and '"' not in value[1:-1] and '\\' not in value:
+        return value[1:-1]
+    if len(value) > 1 and value[0] == value[-1] == "'" and "'" not in value[1:-1]:
+        return value[1:-1]
+    if YAML_INT.fullmatch(value):
+        return int(value)
+    if YAML_FLOAT.fullmatch(value):
+        return float(value)
+    if YAML_TIMESTAMP.fullmatch(value):
+        return datetime.fromisoformat(value)
+    if YAML_PLAIN_STR.fullmatch(value) and value.lower() not in YAML_RESERVED:
+        return value
+    # Anything else (escapes, comments, ...) is left to yaml
+    try:
+        result = yaml.safe_load(value)
+    except yaml.YAMLError as e:
+        # Error is reported by the yaml loader with the right line number
+        raise ValueError(e)
+    # Value is not a scalar, e.g. 'note: late', the line is left to the full yaml loader
+    if isinstance(result, (dict, list)):
+        raise ValueError(f"not a scalar: {value}")
+    return result
+
+def process_downloaded_yaml(downloaded_files, loader='auto', cache_dir=None, max_bytes=PARSE_CACHE_MAX_BYTES,
+                            max_age=PARSE_CACHE_MAX_AGE, store=None, startlist=None, event_id=None):
     """
     Iterates over all downloaded file and separates changes - dns, late starts, changes cards and new comments
     :param downloaded_files: list of lists with filename and contents of downloaded yaml files
+    :param loader: yaml loader used for the reports, see load_report
+    :param cache_dir: local folder for the cache of processed files, unchanged files are not parsed again (optional)
+    :param max_bytes: max size of the cache in bytes
+    :param max_age: max age of the cache entries in seconds
+    :param store: path to the sqlite change store, changes are kept there also when they disappear from the
+                  reports and only new ones are processed (optional)
+    :param startlist: path to the IOF XML 3.0 startlist, missing class, club and start time are filled from it
+                      (optional)
+    :param event_id: id of the event, changes in the store are kept by event, day of the first report is used
+                     when not set (optional)
     :return: dictionary of lists with changes by type
     """
 
-    # Results storage
-    started_ok = []
-    changes_cards = []
-    changes_dns = []
-    changes_late_start = []
-    changes_comments = []
-    changes_statistics = []
+    # Results storage, same change reported by more devices is stored once
+    started_ok = 0
+    index = {change_type: {} for change_type in CHANGE_TYPES}
+    files = []
+    # Reports stored after the event is known
+    new_reports = []
 
     changes = {}
+    cache_updated = False
+    change_store = open_change_store(store) if store is not None else None
 
     for file in downloaded_files:
-        # Load the contents of the downloaded YAML file
-        downloaded_data = yaml.safe_load(file[1])
-
-        # Access report data
-        report_data = downloaded_data['Data']
-        for runner in report_data:
-            # Values
-            runner_id = runner['Runner']['Id'] if runner['Runner']['Id'] is not None else ''
-            runner_start_time = runner['Runner']['StartTime']
-            runner_class_name = runner['Runner']['ClassName']
-            runner_name = runner['Runner']['Name'] if runner['Runner']['Name'] is not None else ''
-            runner_club = runner['Runner']['Org'] if runner['Runner']['Org'] is not None else ''
-            runner_card = runner['Runner']['Card'] if runner['Runner']['Card'] is not None else ''
-
-            if runner['ChangeLog'] is not None:
-                # New card
-                if 'NewCard' in runner['Runner']:
-                    changes_cards.append([
-                        runner_id,
-                        runner_start_time,
-                        runner['ChangeLog']['NewCard'],
-                        runner_name,
-                        runner_class_name,
-                        runner_club,
-                        runner_card,
-                        runner['Runner']['NewCard']
-                    ])
-                # # DNS
-                if 'DNS' in runner['Runner']['StartStatus']:
-                    changes_dns.append([
-                        runner_id,
-                        runner_start_time,
-                        runner['ChangeLog']['DNS'],
-                        runner_name,
-                        runner_class_name,
-                        runner_club,
-                        runner_card
-                    ])
-                # # Late start
-                if 'Late start' in runner['Runner']['StartStatus']:
-                    changes_late_start.append([
-                        runner_id,
-                        runner_start_time,
-                        runner['ChangeLog']['LateStart'],
-                        runner_name,
-                        runner_class_name,
-                        runner_club,
-                        runner_card
-                    ])
-                # # Comment
-                if 'Comment' in runner['Runner']:
-                    changes_comments.append([
-                        runner_id,
-                        runner_start_time,
-                        runner['ChangeLog']['Comment'],
-                        runner_name,
-                        runner_class_name,
-                        runner_club,
-                        runner_card,
-                        runner['Runner']['Comment']
-                    ])
-
-            # Store started runners
-            else:
-                started_ok.append(runner_name + ', ' + runner_class_name + ', ' + runner_club)
-        # Store statistics
-        stats = {'ok': len(started_ok),
-                 'dns': len(changes_dns),
-                 'card-changes': len(changes_cards),
-                 'late-starts': len(changes_late_start),
-                 'comments': len(changes_comments)}
-        changes_statistics.append([file[0], downloaded_data['Created'], downloaded_data['Creator'], downloaded_data['Version'], stats]);
-
-    # Store into the main dictionary
-    changes['dns'] = changes_dns
-    changes['changed_cards'] = changes_cards
-    changes['late_starts'] = changes_late_start
-    changes['comments'] = changes_comments
+        key = hashlib.sha256((PARSE_CACHE_VERSION + file[1]).encode('utf-8')).hexdigest()
+
+        # Changes of the unchanged file are already in the store
+        stored = find_stored_file(change_store, file[0], key, event_id) if change_store is not None else None
+        if stored is not None:
+            started_ok += stored[0]
+            files.append([file[0], stored[1], started_ok])
+            add_metric('change_store_hits')
+            continue
+
+        # Unchanged file is loaded from the cache
+        report = load_parsed_report(cache_dir, key) if cache_dir is not None else None
+        if report is None:
+            report = classify_report(file[1], loader)
+            add_metric('files_parsed')
+            if cache_dir is not None:
+                store_parsed_report(cache_dir, key, report)
+                cache_updated = True
+        else:
+            add_metric('parse_cache_hits')
+
+        started_ok += report['ok']
+        if change_store is not None:
+            new_reports.append([file[0], key, report])
+        else:
+            for change_type in CHANGE_TYPES:
+                for change in report[change_type]:
+                    merge_change(index[change_type], change, file[0])
+        files.append([file[0], report['header'], started_ok])
+
+    if cache_updated:
+        evict_parse_cache(cache_dir, max_bytes, max_age)
+    if change_store is not None:
+        event = event_id if event_id is not None else event_day([[file[0], file[1]['Created']] for file in files])
+        event = str(event or '')
+        withdrawn = False
+        for filename, key, report in new_reports:
+            withdrawn = store_report_changes(change_store, event, filename, key, report) or withdrawn
+        change_store['db'].commit()
+        index = load_stored_changes(change_store, event, reload=withdrawn)
+
+    # Store statistics, counts of the changes reported by the file or by the files before it
+    changes_statistics = []
+    counts = count_changes_by_file(index, [file[0] for file in files])
+    for position, (filename, header, ok) in enumerate(files):
+        stats = {'ok': ok,
+                 'dns': counts['dns'][position],
+                 'card-changes': counts['changed_cards'][position],
+                 'late-starts': counts['late_starts'][position],
+                 'comments': counts['comments'][position]}
+        changes_statistics.append([filename, header['Created'], header['Creator'], header['Version'], stats])
+
+    # Store into the main dictionary, sorted by time of the change
+    startlist_index = load_startlist(startlist) if startlist is not None else None
+    for change_type in CHANGE_TYPES:
+        type_changes = index[change_type].values()
+        if startlist_index is not None:
+            type_changes = [complete_change(change, startlist_index) for change in type_changes]
+        changes[change_type] = sorted(type_changes, key=change_order)
+        add_metric('rows', len(changes[change_type]), change_type=change_type)
+    add_metric('files_processed', len(downloaded_files))
     changes['statistics'] = changes_statistics
 
     # Print statistics
     print(f"Event statistics:\n"
-          f"- started runners: {len(started_ok)}\n"
-          f"- dns: {len(changes_dns)}\n"
-          f"- cards changes: {len(changes_cards)}\n"
-          f"- late starts: {len(changes_late_start)}\n"
-          f"- new comments: {len(changes_comments)}")
+          f"- started runners: {started_ok}\n"
+          f"- dns: {len(changes['dns'])}\n"
+          f"- cards changes: {len(changes['changed_cards'])}\n"
+          f"- late starts: {len(changes['late_starts'])}\n"
+          f"- new comments: {len(changes['comments'])}")
 
     return changes
 
-def generate_html_report(changes, report_name = 'online-report'):
+def merge_change(index, change, source):
+    """
+    Add change into the index of one change type, duplicate change of the same runner keeps the latest time
+    :param index: dictionary (runner, value) -> Change
+    :param change: new Change
+    :param source: name of the file with the change
+    """
+    # Runners without id are identified by name and card, different comments or new cards of one runner
+    # are kept as separate changes
+    key = (change.runner_id or (change.name, change.card), change.value)
+    current = index.get(key)
+    if current is None:
+        index[key] = change._replace(sources=(source,))
+        return
+
+    sources = current.sources if source in current.sources else current.sources + (source,)
+    if is_later(change.changed_at, current.changed_at):
+        current = change
+    index[key] = current._replace(sources=sources)
+
+def count_changes_by_file(index, filenames):
+    """
+    Count changes reported by the files up to each file
+    :param index: dictionary of change type -> (runner, value) -> Change
+    :param filenames: names of the files in the processing order
+    :return: dictionary of change type -> list of counts by file
+    """
+    positions = {filename: position for position, filename in enumerate(filenames)}
+    counts = {}
+    for change_type in CHANGE_TYPES:
+        # Change is counted from the first file which reported it
+        first = [0] * len(filenames)
+        for change in index[change_type].values():
+            reported = [positions[source] for source in change.sources if source in positions]
+            if reported:
+                first[min(reported)] += 1
+        counts[change_type] = list(itertools.accumulate(first))
+    return counts
+
+def is_later(time, other_time):
+    """
+    Compare change times, missing time is the oldest one
+    """
+    if time is None or other_time is None:
+        return other_time is None and time is not None
+    try:
+        return time > other_time
+    except TypeError:
+        # Naive and aware time
+        return time.timestamp() > other_time.timestamp()
+
+def classify_report(content, loader='auto'):
+    """
+    Separate changes of one report - dns, late starts, changes cards and new comments
+    :param content: yaml file content
+    :param loader: yaml loader used for the report, see load_report
+    :return: dictionary of lists with changes by type, number of started runners and report header
+    """
+
+    # Results storage, runners without changes are only counted
+    started_ok = 0
+    changes_cards = []
+    changes_dns = []
+    changes_late_start = []
+    changes_comments = []
+
+    # Stream the contents of the downloaded YAML file, header is filled while streaming
+    downloaded_data = {}
+    for runner in iter_report_runners(content, downloaded_data, loader):
+        # Values, start time and class are missing in some reports and are filled from the startlist
+        runner_id = runner['Runner'].get('Id') if runner['Runner'].get('Id') is not None else ''
+        runner_start_time = runner['Runner'].get('StartTime')
+        runner_class_name = runner['Runner'].get('ClassName') if runner['Runner'].get('ClassName') is not None else ''
+        runner_name = runner['Runner'].get('Name') if runner['Runner'].get('Name') is not None else ''
+        runner_club = runner['Runner'].get('Org') if runner['Runner'].get('Org') is not None else ''
+        runner_card = runner['Runner'].get('Card') if runner['Runner'].get('Card') is not None else ''
+
+        if runner['ChangeLog'] is not None:
+            # New card
+            if 'NewCard' in runner['Runner']:
+                changes_cards.append(Change(
+                    runner_id,
+                    runner_start_time,
+                    runner['ChangeLog']['NewCard'],
+                    runner_name,
+                    runner_class_name,
+                    runner_club,
+                    runner_card,
+                    scalar_value(runner['Runner']['NewCard'])
+                ))
+            # # DNS
+            if 'DNS' in runner['Runner']['StartStatus']:
+                changes_dns.append(Change(
+                    runner_id,
+                    runner_start_time,
+                    runner['ChangeLog']['DNS'],
+                    runner_name,
+                    runner_class_name,
+                    runner_club,
+                    runner_card
+                ))
+            # # Late start
+            if 'Late start' in runner['Runner']['StartStatus']:
+                changes_late_start.append(Change(
+                    runner_id,
+                    runner_start_time,
+                    runner['ChangeLog']['LateStart'],
+                    runner_name,
+                    runner_class_name,
+                    runner_club,
+                    runner_card
+                ))
+            # # Comment
+            if 'Comment' in runner['Runner']:
+                changes_comments.append(Change(
+                    runner_id,
+                    runner_start_time,
+                    runner['ChangeLog']['Comment'],
+                    runner_name,
+                    runner_class_name,
+                    runner_club,
+                    runner_card,
+                    scalar_value(runner['Runner']['Comment'])
+                ))
+
+        # Store started runners
+        else:
+            started_ok += 1
+
+    return {'ok': started_ok,
+            'dns': changes_dns,
+            'changed_cards': changes_cards,
+            'late_starts': changes_late_start,
+            'comments': changes_comments,
+            'header': {'Created': downloaded_data['Created'],
+                       'Creator': downloaded_data['Creator'],
+                       'Version': downloaded_data['Version']}}
+
+def scalar_value(value):
+    """
+    Value of the change as scalar, mapping or list (e.g. unquoted 'Comment: {note: late}') is converted to text,
+    changes are used as dictionary keys
+    """
+    if isinstance(value, (dict, list)):
+        return yaml.safe_dump(value, default_flow_style=True, allow_unicode=True).strip()
+    return value
+
+def load_parsed_report(cache_dir, key):
+    """
+    Load processed report from the cache
+    :param cache_dir: local cache folder
+    :param key: hash of the file content
+    :return: result of classify_report or None when it is not in the cache
+    """
+    path = os.path.join(cache_dir, key + '.pickle')
+    try:
+        with open(path, 'rb') as f:
+            report = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
+    # Recently used entries are evicted last
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return report
+
+def store_parsed_report(cache_dir, key, report):
+    """
+    Store processed report into the cache
+    :param cache_dir: local cache folder
+    :param key: hash of the file content
+    :param report: result of classify_report
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, key + '.pickle')
+    with open(path + '.tmp', 'wb') as f:
+        pickle.dump(report, f, pickle.HIGHEST_PROTOCOL)
+    os.replace(path + '.tmp', path)
+
+def evict_parse_cache(cache_dir, max_bytes=PARSE_CACHE_MAX_BYTES, max_age=PARSE_CACHE_MAX_AGE):
+    """
+    Remove old entries from the cache, least recently used are removed first when the cache is too big
+    :param cache_dir: local cache folder
+    :param max_bytes: max size of the cache in bytes
+    :param max_age: max age of the entries in seconds
+    """
+    entries = []
+    now = time.time()
+    for name in os.listdir(cache_dir):
+        if not name.endswith('.pickle'):
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        entries.append([stat.st_mtime, stat.st_size, path])
+
+    total = sum(entry[1] for entry in entries)
+    for modified, size, path in sorted(entries):
+        if now - modified <= max_age and total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+
+def open_change_store(path):
+    """
+    Open the change store, it stays open for next runs in the same process
+    :param path: path to the sqlite database
+    :return: dictionary with database connection and loaded changes by event
+    """
+    change_store = CHANGE_STORES.get(path)
+    if change_store is None:
+        db = sqlite3.connect(path)
+        # Store of the older version can not be used, e.g. it has no event of the changes
+        if db.execute('PRAGMA user_version').fetchone()[0] != CHANGE_STORE_VERSION:
+            db.executescript('DROP TABLE IF EXISTS changes; DROP TABLE IF EXISTS files;')
+            db.execute(f'PRAGMA user_version = {CHANGE_STORE_VERSION}')
+        db.executescript(CHANGE_STORE_SCHEMA)
+        change_store = {'db': db, 'events': {}}
+        CHANGE_STORES[path] = change_store
+    return change_store
+
+def find_stored_file(change_store, filename, key, event_id=None):
+    """
+    Find the file with same content in the store
+    :param change_store: opened store from open_change_store
+    :param filename: name of the file with the report
+    :param key: hash of the file content
+    :param event_id: id of the event, day of the report is used when not set
+    :return: number of started runners and report header or None when the file is not stored
+    """
+    cursor = change_store['db'].execute('SELECT event, ok, header FROM files WHERE name = ? AND hash = ?',
+                                        (filename, key))
+    for event, ok, header in cursor:
+        header = pickle.loads(header)
+        expected = event_id if event_id is not None else event_day([[filename, header['Created']]])
+        if event == str(expected or ''):
+            return ok, header
+    return None
+
+def store_report_changes(change_store, event, filename, key, report):
+    """
+    Append changes of the report into the store, changes which are already stored are ignored, changes of the file
+    missing in the report are marked as removed
+    :param change_store: opened store from open_change_store
+    :param event: id of the event
+    :param filename: name of the file with the report
+    :param key: hash of the file content
+    :param report: result of classify_report
+    :return: True when some stored change was removed or returned back
+    """
+    now = time.time()
+    rows = {}
+    for change_type in CHANGE_TYPES:
+        for change in report[change_type]:
+            changed_at = '' if change.changed_at is None else change.changed_at.isoformat()
+            rows[(change.runner_id or f"{change.name}\n{change.card}", change_type, changed_at)] = change
+
+    # Changes withdrawn by the phone (e.g. unticked DNS) and changes reported again
+    db = change_store['db']
+    removed = []
+    restored = []
+    cursor = db.execute('SELECT id, runner_key, change_type, changed_at, removed_at FROM changes '
+                        'WHERE event = ? AND source = ?', (event, filename))
+    for change_id, runner_key, change_type, changed_at, removed_at in cursor:
+        reported = rows.pop((runner_key, change_type, changed_at), None) is not None
+        if reported and removed_at is not None:
+            restored.append((change_id,))
+        elif not reported and removed_at is None:
+            removed.append((now, change_id))
+    db.executemany('UPDATE changes SET removed_at = ? WHERE id = ?', removed)
+    db.executemany('UPDATE changes SET removed_at = NULL WHERE id = ?', restored)
+
+    db.executemany('INSERT INTO changes (event, runner_key, change_type, changed_at, source, stored_at, change) '
+                   'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                   ((event, runner_key, change_type, changed_at, filename, now,
+                     pickle.dumps(change, pickle.HIGHEST_PROTOCOL))
+                    for (runner_key, change_type, changed_at), change in rows.items()))
+    db.execute('INSERT OR REPLACE INTO files (event, name, hash, ok, header) VALUES (?, ?, ?, ?, ?)',
+               (event, filename, key, report['ok'], pickle.dumps(report['header'], pickle.HIGHEST_PROTOCOL)))
+    return bool(removed or restored)
+
+def load_stored_changes(change_store, event, reload=False):
+    """
+    Merge changes of the event stored since the last call into the loaded ones
+    :param change_store: opened store from open_change_store
+    :param event: id of the event
+    :param reload: load all changes again, used when some changes were removed
+    :return: dictionary of change type -> (runner, value) -> Change
+    """
+    loaded = change_store['events'].get(event)
+    if loaded is None or reload:
+        loaded = change_store['events'][event] = {'last_id': 0,
+                                                  'index': {change_type: {} for change_type in CHANGE_TYPES}}
+    index = loaded['index']
+    cursor = change_store['db'].execute('SELECT id, change_type, source, removed_at, change FROM changes '
+                                        'WHERE event = ? AND id > ? ORDER BY id', (event, loaded['last_id']))
+    for change_id, change_type, source, removed_at, change in cursor:
+        if removed_at is None:
+            merge_change(index[change_type], pickle.loads(change), source)
+        loaded['last_id'] = change_id
+    return index
+
+def load_startlist(path):
+    """
+    Load index of the IOF XML 3.0 startlist, the index is stored next to the startlist and built again only
+    when the startlist changes
+    :param path: path to the startlist
+    :return: dictionary with 'persons' (person id -> entry) and 'cards' (card number -> entry),
+             entry is tuple of class name, club and start time
+    """
+    stat = os.stat(path)
+    stamp = (STARTLIST_INDEX_VERSION, stat.st_size, stat.st_mtime_ns)
+    loaded = STARTLISTS.get(path)
+    if loaded is not None and loaded[0] == stamp:
+        return loaded[1]
+
+    index_path = path + '.index'
+    startlist_index = None
+    try:
+        with open(index_path, 'rb') as f:
+            stored_stamp, stored_index = pickle.load(f)
+        if stored_stamp == stamp:
+            startlist_index = stored_index
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError, TypeError):
+        pass
+
+    if startlist_index is None:
+        startlist_index = index_startlist(path)
+        try:
+            with open(index_path + '.tmp', 'wb') as f:
+                pickle.dump([stamp, startlist_index], f, pickle.HIGHEST_PROTOCOL)
+            os.replace(index_path + '.tmp', index_path)
+        except OSError as e:
+            print(f"Startlist index was not stored: {e}", file=sys.stderr)
+
+    STARTLISTS[path] = [stamp, startlist_index]
+    return startlist_index
+
+def index_startlist(path):
+    """
+    Build index of the IOF XML 3.0 startlist, elements are dropped right after reading so big startlists
+    are not kept in memory
+    :param path: path to the startlist
+    :return: index, see load_startlist
+    """
+    persons = {}
+    cards = {}
+    class_name = ''
+    for event, element in ElementTree.iterparse(path, events=('end',)):
+        tag = element.tag.rpartition('}')[2]
+        if tag == 'Class':
+            class_name = xml_text(element, 'Name')
+        elif tag == 'PersonStart':
+            person_id = xml_text(element, 'Person', 'Id')
+            club = xml_text(element, 'Organisation', 'Name') or xml_text(element, 'Organisation', 'ShortName')
+            start = xml_child(element, 'Start')
+            start_time = parse_xml_time(xml_text(start, 'StartTime')) if start is not None else None
+            entry = (class_name, club, start_time)
+            if person_id:
+                persons[person_id] = entry
+            # Runner can have more cards in multi-race events
+            if start is not None:
+                for child in start:
+                    if child.tag.rpartition('}')[2] == 'ControlCard' and child.text:
+                        cards[child.text.strip()] = entry
+            element.clear()
+        elif tag == 'ClassStart':
+            element.clear()
+            class_name = ''
+    return {'persons': persons, 'cards': cards}
+
+def xml_child(element, *path):
+    """
+    Find child element by local names, namespace of the IOF XML is ignored
+    """
+    for name in path:
+        if element is None:
+            return None
+        element = next((child for child in element if child.tag.rpartition('}')[2] == name), None)
+    return element
+
+def xml_text(element, *path):
+    """
+    Text of the child element by local names, empty string when it is missing
+    """
+    child = xml_child(element, *path)
+    return child.text.strip() if child is not None and child.text else ''
+
+def parse_xml_time(value):
+    """
+    Parse time from the IOF XML, None when it is missing or invalid
+    """
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+
+def complete_change(change, startlist_index):
+    """
+    Fill missing class, club and start time of the change from the startlist
+    :param change: Change
+    :param startlist_index: index from load_startlist
+    :return: completed Change
+    """
+    if change.class_name and change.club and change.start_time is not None:
+        return change
+    entry = startlist_index['persons'].get(str(change.runner_id)) if change.runner_id else None
+    if entry is None and change.card != '':
+        entry = startlist_index['cards'].get(str(change.card))
+    if entry is None:
+        return change
+    return change._replace(class_name=change.class_name or entry[0], club=change.club or entry[1],
+                           start_time=change.start_time if change.start_time is not None else entry[2])
+
+def generate_html_report(changes, report_name = 'online-report', feed=None, virtual_rows=None, event_id=None,
+                         sync_url=None):
     """
     Create html report with changes from the start in hrml format which is more readable.
-    :param changes:
+    :param changes: dictionary of lists with changes by type from process_downloaded_yaml
+    :param report_name: name of the html report
+    :param feed: dictionary with version of the json feed and polling interval, enables live update (optional)
+    :param virtual_rows: tables with more rows are rendered by main.js only in the visible part (optional)
+    :param event_id: id of the event, day of the first report is used when not set (optional)
+    :param sync_url: url or port of the solved state sync server, ticks are shared by the browsers (optional)
     :return: html_file
     """
 
@@ -181,9 +1628,10 @@ def generate_html_report(changes, report_name = 'online-report'):
                 <!-- TODO: Can be used instead of live-server -->
                 <!--<meta http-equiv="refresh" content="30"> -->           
                 <link rel="stylesheet" href="src/style.css">                
+                <meta name="report-hash" content="{report_hash}">
                 <title>{heading}</title>
             </head>
-            <body onload="sortTable(0, 'dataDNS'),sortTable(0, 'dataCards'),sortTable(0, 'dataLateStart'),sortTable(0, 'dataComments'),sortTable(0, 'dataStatistics')">
+            <body data-event='{event}'{feed_attributes}>
                 <header>
                     <h1>{heading}</h1>
                     <h2>{time_stamp}</h2>
@@ -211,271 +1659,670 @@ def generate_html_report(changes, report_name = 'online-report'):
         </html>
     '''
 
-    # DNS
-    dns_changes_template = '''
-                    <p class="cat-title">
-                        <span class="category">Přehled neběžících závodníků a závodnic</span>
-                    </p>
-                    <table id='dataDNS'>                        
-                        {table_data}
-                    </table>
-                '''
-    dns_changes_data = ''
-    if len(changes['dns']) == 0:
-        dns_changes_data += '''
-        <tr>        
-            <td class='nodata' colspan='4'>Žadní neběžící závodníci a závodnice.</td>
-        </tr>
-        '''
-    else:
-        dns_changes_data += '''
-                <tr>
-                    <!-- <th class='id'>Id</th> -->
-                    <th onclick="sortTable(0, 'dataDNS')" class='solved'>Vyřešeno</th>
-                    <th onclick="sortTable(1, 'dataDNS')" class='timestamp'>Čas změny</th>
-                    <th onclick="sortTable(2, 'dataDNS')" class='timestamp'>Star. čas</th>
-                    <th onclick="sortTable(3, 'dataDNS')" class='name'>Jméno</th>
-                    <th onclick="sortTable(4, 'dataDNS')" class='class'>Kategorie</th>
-                    <th onclick="sortTable(5, 'dataDNS')" class='club'>Klub</th>
-                    <th onclick="sortTable(6, 'dataDNS')" class='card'>Čip</th>
-                </tr>
-                '''
-        for dns in changes['dns']:
-            dns_changes_data += '''            
-            <tr id='''+dns[1].strftime('%Y%m%d%H%M%S')+dns[4]+'''>
-                <!-- <td class='id'>'''+dns[0]+'''</td> -->
-                <td><input type="checkbox" class="solved"></td>
-                <td class='timestamp'>'''+dns[2].strftime('%H:%M:%S')+'''</td>
-                <td class='starttime'>'''+dns[1].strftime('%H:%M:%S')+'''</td>
-                <td class='name'>'''+dns[3]+'''</td>
-                <td class='class'>'''+dns[4]+'''</td>
-                <td class='club'>'''+dns[5]+'''</td>
-                <td class='card'>'''+str(dns[6])+'''</td>
-            </tr>
-            '''
-    dns_changes_html = dns_changes_template.format(table_data=dns_changes_data)
+    # Rows of the current report, fragments of the rows which are not in the report anymore are dropped
+    row_cache = {}
+    tables = {change_type: render_table(REPORT_TABLES[change_type], changes[change_type], row_cache, virtual_rows)
+              for change_type in CHANGE_TYPES}
+    ROW_CACHE.clear()
+    ROW_CACHE.update(row_cache)
 
-    # Cards
-    cards_changes_template = '''
-                    <p class="cat-title">
-                        <span class="category">Přehled změn čipů</span>
-                    </p>
-                    <table id='dataCards'>                        
-                        {table_data}
-                    </table>
-                '''
-    cards_changes_data = ''
-    if len(changes['changed_cards']) == 0:
-        cards_changes_data += '''
-        <tr>
-            <td class='nodata' colspan='5'>Žadné změny čipů.</td>
-        </tr>
-        '''
+    # Statistics
+    if len(changes['statistics']) == 0:
+        statistics_changes_data = STATISTICS_EMPTY
     else:
-        cards_changes_data += '''
-                <tr>
-                    <!-- <th class='id'>Id</th> -->
-                    <th onclick="sortTable(0, 'dataCards')" class='solved'>Vyřešeno</th>
-                    <th onclick="sortTable(1, 'dataCards')" class='timestamp'>Čas změny</th>
-                    <th onclick="sortTable(2, 'dataCards')" class='starttime'>Star. čas</th>
-                    <th onclick="sortTable(3, 'dataCards')" class='name'>Jméno</th>
-                    <th onclick="sortTable(4, 'dataCards')" class='class'>Kategorie</th>
-                    <th onclick="sortTable(5, 'dataCards')" class='club'>Klub</th>
-                    <th onclick="sortTable(6, 'dataCards')" class='oldcard'>Starý čip</th>
-                    <th onclick="sortTable(7, 'dataCards')" class='card'>Nový čip</th>
-                </tr>
-                '''
-        for card in changes['changed_cards']:
-            cards_changes_data += '''            
-            <tr id='''+card[1].strftime('%Y%m%d%H%M%S')+card[4]+'''>
-                <!-- <td class='id'>'''+card[0]+'''</td> -->
-                <td><input type="checkbox" class="solved"></td>
-                <td class='timestamp'>'''+card[2].strftime('%H:%M:%S')+'''</td>
-                <td class='starttime'>'''+card[1].strftime('%H:%M:%S')+'''</td>
-                <td class='name'>'''+card[3]+'''</td>
-                <td class='class'>'''+card[4]+'''</td>
-                <td class='club'>'''+card[5]+'''</td>
-                <td class='oldcard'>'''+str(card[6])+'''</td>
-                <td class='card'>'''+str(card[7])+'''</td>
-            </tr>
-            '''
-    cards_changes_html = cards_changes_template.format(table_data=cards_changes_data)
+        statistics_rows = []
+        for statistics_row_id, cells in statistics_cells(changes['statistics']):
+            statistics_rows.append(STATISTICS_ROW.format(
+                row_id=escape_html(statistics_row_id),
+                cells=''.join(STATISTICS_CELL.format(css_class=css_class, value=escape_html(value))
+                              for css_class, value in zip(STATISTICS_COLUMNS, cells))
+            ))
+        statistics_changes_data = STATISTICS_HEADER + ''.join(statistics_rows)
+    statistics_changes_html = STATISTICS_TEMPLATE.format(table_data=statistics_changes_data)
 
-    # Late starts
-    late_starts_changes_template = '''
-                    <p class="cat-title">
-                        <span class="category">Přehled opožděných startů</span>
-                    </p>
-                    <table id='dataLateStart'>                        
-                        {table_data}                        
-                    </table>
-                '''
-    late_starts_changes_data = ''
-    if len(changes['late_starts']) == 0:
-        late_starts_changes_data += '''
-        <tr>
-            <td class='nodata' colspan='4'>Žadné opožděné starty.</td>
-        </tr>
-        '''
-    else:
-        late_starts_changes_data += '''
-                <tr>
-                    <!-- <th class='id'>Id</th> -->
-                    <th onclick="sortTable(0, 'dataLateStart')" class='solved'>Vyřešeno</th>
-                    <th onclick="sortTable(1, 'dataLateStart')" class='timestamp'>Čas změny</th>
-                    <th onclick="sortTable(2, 'dataLateStart')" class='starttime'>Star. čas</th>
-                    <th onclick="sortTable(3, 'dataLateStart')" class='name'>Jméno</th>
-                    <th onclick="sortTable(4, 'dataLateStart')" class='class'>Kategorie</th>
-                    <th onclick="sortTable(5, 'dataLateStart')" class='club'>Klub</th>
-                    <th onclick="sortTable(6, 'dataLateStart')" class='card'>Čip</th>
-                </tr>
-                '''
-        for late_start in changes['late_starts']:
-            late_starts_changes_data += '''            
-            <tr id='''+late_start[1].strftime('%Y%m%d%H%M%S')+late_start[4]+'''>
-                <!-- <td class='id'>'''+late_start[0]+'''</td> -->
-                <td><input type="checkbox" class="solved"></td>
-                <td class='timestamp'>'''+late_start[2].strftime('%H:%M:%S')+'''</td>
-                <td class='starttime'>'''+late_start[1].strftime('%H:%M:%S')+'''</td>
-                <td class='name'>'''+late_start[3]+'''</td>
-                <td class='class'>'''+late_start[4]+'''</td>
-                <td class='club'>'''+late_start[5]+'''</td>
-                <td class='card'>'''+str(late_start[6])+'''</td>
-            </tr>
-            '''
-    late_starts_changes_html = late_starts_changes_template.format(table_data=late_starts_changes_data)
+    # Live update from the json feed
+    feed_attributes = ''
+    if feed is not None:
+        feed_attributes = (f" data-feed='{escape_html(os.path.basename(report_name))}'"
+                           f" data-feed-version='{feed['version']}' data-feed-interval='{feed['interval']}'")
+    if sync_url is not None:
+        feed_attributes += f" data-sync='{escape_html(str(sync_url))}'"
 
-    # Comments
-    comments_changes_template = '''
-                    <p class="cat-title">
-                        <span class="category">Přehled komentářů od startérů</span>
-                    </p>
-                    <table id='dataComments'>              
-                        {table_data}  
-                    </table>
-                '''
-    comments_changes_data = ''
-    if len(changes['comments']) == 0:
-        comments_changes_data += '''
-        <tr>
-            <td class='nodata' colspan='5'>Žádné nové komentáře.</td>
-        </tr>
-        '''
-    else:
-        comments_changes_data += '''
-                <tr>
-                    <!-- <th class='id'>Id</th> -->
-                    <th onclick="sortTable(0, 'dataComments')" class='solved'>Vyřešeno</th>
-                    <th onclick="sortTable(1, 'dataComments')" class='timestamp'>Čas změny</th>
-                    <th onclick="sortTable(2, 'dataComments')" class='starttime'>Star. čas</th>
-                    <th onclick="sortTable(3, 'dataComments')" class='name'>Jméno</th>
-                    <th onclick="sortTable(4, 'dataComments')" class='class'>Kategorie</th>
-                    <th onclick="sortTable(5, 'dataComments')" class='club'>Klub</th>
-                    <th onclick="sortTable(6, 'dataComments')" class='card'>Čip</th>
-                    <th onclick="sortTable(7, 'dataComments')" class='comment'>Komentář</th>
-                </tr> 
-                '''
-        for comment in changes['comments']:
-            comments_changes_data += '''            
-            <tr id='''+comment[1].strftime('%Y%m%d%H%M%S')+comment[4]+'''>
-                <!-- <td class='id'>''' + comment[0] + '''</td> -->
-                <td><input type="checkbox" class="solved"></td>
-                <td class='starttime'>''' + comment[1].strftime('%H:%M:%S') + '''</td>
-                <td class='timestamp'>''' + comment[2].strftime('%H:%M:%S') + '''</td>
-                <td class='name'>'''+comment[3]+'''</td>
-                <td class='class'>'''+comment[4]+'''</td>
-                <td class='club'>'''+comment[5]+'''</td>
-                <td class='card'>'''+str(comment[6])+'''</td>
-                <td class='comment'>'''+comment[7]+'''</td>
-            </tr>
-            '''
-    comments_changes_html = comments_changes_template.format(table_data=comments_changes_data)
+    # Solved rows in the browser are stored by event, reports from another day do not share them
+    if event_id is None:
+        event_id = event_day(changes['statistics']) or os.path.basename(report_name)
+    event = escape_html(str(event_id))
 
-    # Statistics
-    statistics_changes_template = '''
-                        <p class="cat-title">
-                            <span class="category">Statistiky</span>
-                        </p>
-                        <table id='dataStatistics'>              
-                            {table_data}  
-                        </table>
-                    '''
-    statistics_changes_data = ''
-    if len(changes['statistics']) == 0:
-        comments_changes_data += '''
-        <tr>
-            <td class='nodata' colspan='5'>Žádné statistiky.</td>
-        </tr>
-        '''
-    else:
-        statistics_changes_data += '''
-                <tr>
-                    <th onclick="sortTable(0, 'dataStatistics')" class='filename'>Název souboru</th>
-                    <th onclick="sortTable(1, 'dataStatistics')" class='created'>Datum vytvoření</th>
-                    <th onclick="sortTable(2, 'dataStatistics')" class='creator'>Verze aplikace</th>
-                    <th onclick="sortTable(3, 'dataStatistics')" class='version'>Verze reportu</th>
-                    <th onclick="sortTable(4, 'dataStatistics')" class='ok'>OK</th>
-                    <th onclick="sortTable(5, 'dataStatistics')" class='dns'>DNS</th>
-                    <th onclick="sortTable(6, 'dataStatistics')" class='new-cards'>New cards</th>
-                    <th onclick="sortTable(7, 'dataStatistics')" class='late-starts'>Late starts</th>
-                    <th onclick="sortTable(8, 'dataStatistics')" class='new-comments'>New comments</th>
-                </tr> 
-                '''
-        for i in range(0,len(changes['statistics'])):
-            if i == 0:
-                statistics_changes_data += '''            
-                <tr>
-                    <td class='file'>''' + changes['statistics'][i][0] + '''</td>
-                    <td class='created'>'''+changes['statistics'][i][1].strftime('%H:%M:%S')+'''</td>
-                    <td class='creator'>'''+changes['statistics'][i][2]+'''</td>
-                    <td class='version'>'''+str(changes['statistics'][i][3])+'''</td>
-                    <td class='ok'>'''+str(changes['statistics'][i][4]['ok'])+'''</td>
-                    <td class='dns'>'''+str(changes['statistics'][i][4]['dns'])+'''</td>
-                    <td class='new-cards'>'''+str(changes['statistics'][i][4]['card-changes'])+'''</td>
-                    <td class='late-starts'>'''+str(changes['statistics'][i][4]['late-starts'])+'''</td>
-                    <td class='new-comments'>'''+str(changes['statistics'][i][4]['comments'])+'''</td>
-                </tr>
-                '''
-            else:
-                statistics_changes_data += '''            
-                <tr>
-                    <td class='file'>''' + changes['statistics'][i][0] + '''</td>
-                    <td class='created'>''' + changes['statistics'][i][1].strftime('%H:%M:%S') + '''</td>
-                    <td class='creator'>''' + changes['statistics'][i][2] + '''</td>
-                    <td class='version'>''' + str(changes['statistics'][i][3]) + '''</td>
-                    <td class='ok'>''' + str(changes['statistics'][i][4]['ok']-changes['statistics'][i-1][4]['ok']) + '''</td>
-                    <td class='dns'>''' + str(changes['statistics'][i][4]['dns']-changes['statistics'][i-1][4]['dns']) + '''</td>
-                    <td class='new-cards'>''' + str(changes['statistics'][i][4]['card-changes']-changes['statistics'][i-1][4]['card-changes']) + '''</td>
-                    <td class='late-starts'>''' + str(changes['statistics'][i][4]['late-starts']-changes['statistics'][i-1][4]['late-starts']) + '''</td>
-                    <td class='new-comments'>''' + str(changes['statistics'][i][4]['comments']-changes['statistics'][i-1][4]['comments']) + '''</td>
-                </tr>
-                '''
-    statistics_changes_html = statistics_changes_template.format(table_data=statistics_changes_data)
+    # Hash of the report content without the time stamp
+    content = [html_file_template, event, feed_attributes, tables['dns'], tables['changed_cards'], tables['late_starts'],
+               tables['comments'], statistics_changes_html]
+    report_hash = hashlib.sha256('\0'.join(content).encode('utf-8')).hexdigest()
 
     # Generate html report
     html_file = html_file_template.format(heading='O Checklist report',
                                           time_stamp=datetime.now().strftime('%d.%m.%Y %H:%M:%S'),
-                                          content_dns=dns_changes_html,
-                                          content_cards=cards_changes_html,
-                                          content_late_start=late_starts_changes_html,
-                                          content_comments=comments_changes_html,
+                                          report_hash=report_hash,
+                                          event=event,
+                                          feed_attributes=feed_attributes,
+                                          content_dns=tables['dns'],
+                                          content_cards=tables['changed_cards'],
+                                          content_late_start=tables['late_starts'],
+                                          content_comments=tables['comments'],
                                           content_statistics=statistics_changes_html)
-    # Write the HTML to a file
-    with open(report_name+".html", "w", encoding='utf-8') as f:
-        f.write(html_file)
+    # Write the HTML to a file, unchanged report is not written to avoid reload of the browsers
+    report_written = read_report_hash(report_name + ".html") != report_hash
+    if report_written:
+        write_file_atomic(report_name + ".html", html_file)
+    add_metric('report_written', int(report_written))
 
     return html_file
 
-# Not used yet, under development
-def parse_args() -> Tuple[int, str]:
+def event_day(statistics):
+    """
+    Day of the event from the creation time of the first report
+    :param statistics: list of statistics rows from process_downloaded_yaml
+    :return: date as YYYY-MM-DD or None when there is no report
+    """
+    for row in statistics:
+        created = row[1]
+        if isinstance(created, datetime):
+            return created.date().isoformat()
+        if created:
+            return str(created)[:10]
+    return None
+
+def read_report_hash(path):
+    """
+    Read hash of the content from the existing html report
+    :param path: path to the html report
+    :return: hash or None when the report does not exist
+    """
+    try:
+        with open(path, encoding='utf-8') as f:
+            head = f.read(REPORT_HASH_LOOKUP)
+    except (OSError, UnicodeDecodeError):
+        return None
+    match = REPORT_HASH.search(head)
+    return match.group(1) if match is not None else None
+
+def write_file_atomic(path, content):
+    """
+    Write file via temporary file and rename, readers never see half written file
+    :param path: path to the file
+    :param content: file content
+    """
+    folder, name = os.path.split(os.path.abspath(path))
+    # Dot files are ignored by live-server
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + name + '.', suffix='.tmp', dir=folder)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(content)
+        # Temporary file is readable only by the owner
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def render_table(table, changes, row_cache, virtual_rows=None):
+    """
+    Create html table with changes, rows are joined in one pass
+    :param table: table definition from REPORT_TABLES
+    :param changes: list of Change
+    :param row_cache: dictionary filled with the fragments of the rendered rows
+    :param virtual_rows: tables with more rows are rendered by main.js only in the visible part (optional)
+    :return: html of the table
+    """
+    if len(changes) == 0:
+        table_data = table['empty']
+    elif virtual_rows is not None and len(changes) > virtual_rows:
+        return render_virtual_table(table, changes, row_cache)
+    else:
+        row_template = table['row']
+        rows = []
+        rendered = 0
+        for change in changes:
+            # Only new or changed rows are formatted, unchanged ones are taken from the previous run
+            key = (table['id'], change)
+            row = ROW_CACHE.get(key)
+            if row is None:
+                row = render_row(row_template, change)
+                rendered += 1
+            row_cache[key] = row
+            rows.append(row)
+        table_data = table['header'] + ''.join(rows)
+        add_metric('rows_rendered', rendered)
+        add_metric('row_cache_hits', len(changes) - rendered)
+    return TABLE_TEMPLATE.format(table_id=table['id'], title=table['title'], table_data=table_data)
+
+def render_virtual_table(table, changes, row_cache):
+    """
+    Create html table with header only, rows are stored as json data rendered by main.js
+    :param table: table definition from REPORT_TABLES
+    :param changes: list of Change
+    :param row_cache: dictionary filled with the json fragments of the rows
+    :return: html of the table
+    """
+    rows = []
+    rendered = 0
+    for change in changes:
+        key = (table['id'] + '-json', change)
+        row = ROW_CACHE.get(key)
+        if row is None:
+            rendered += 1
+            row = json.dumps({'id': change_row_id(change),
+                              'cells': change_cells(change, table),
+                              'sort': change_sort_keys(change, table)}, ensure_ascii=False)
+            # Json is inside of the script element
+            row = row.replace('<', '\\u003c')
+        row_cache[key] = row
+        rows.append(row)
+    add_metric('rows_rendered', rendered)
+    add_metric('row_cache_hits', len(changes) - rendered)
+    table_data = ('{"columns": ' + json.dumps(table['columns']) + ', "checkbox": true, "rows": [' +
+                  ', '.join(rows) + ']}')
+    return VIRTUAL_TABLE_TEMPLATE.format(table_id=table['id'], title=table['title'], table_header=table['header'],
+                                         table_data=table_data)
+
+def render_row(row_template, change):
+    """
+    Create html row of one change
+    :param row_template: compiled row template from REPORT_TABLES
+    :param change: Change
+    :return: html of the row
+    """
+    template, pick = row_template
+    return template % pick((
+        escape_html(change_row_id(change)),
+        escape_html(', '.join(change.sources)),
+        escape_html(change.runner_id),
+        format_time(change.changed_at),
+        format_time(change.start_time),
+        escape_html(change.name),
+        escape_html(change.class_name),
+        escape_html(change.club),
+        escape_html(change.card),
+        escape_html(change.value),
+        time_sort_key(change.changed_at),
+        time_sort_key(change.start_time),
+        escape_html(number_sort_key(change.card)),
+        escape_html(number_sort_key(change.value))
+    ))
+
+def change_row_id(change):
+    """
+    Id of the report row with the change, it must not change when the runner is completed from the startlist
+    (complete_change), the solved status is stored by the id
+    """
+    # Runner without id is identified by the name and card same as in merge_change
+    runner = change.runner_id or hashlib.sha1(f"{change.name}\n{change.card}".encode('utf-8')).hexdigest()[:12]
+    row_id = 'runner-' + str(runner)
+    # Runner can have more comments or new cards, see merge_change
+    if change.value is not None:
+        row_id += '-' + hashlib.sha1(str(change.value).encode('utf-8')).hexdigest()[:8]
+    return row_id
+
+def change_cells(change, table):
+    """
+    Texts of the report row cells with the change (without the checkbox)
+    :param change: Change
+    :param table: table definition from REPORT_TABLES
+    :return: list of texts in the order of table columns
+    """
+    cells = [format_time(change.changed_at), format_time(change.start_time), change.name, change.class_name,
+             change.club, str(change.card)]
+    if len(table['columns']) > len(cells):
+        cells.append(str(change.value))
+    return cells
+
+def change_sort_keys(change, table):
+    """
+    Sort keys of the report row cells with the change, same as data-sort attributes of the html cells
+    :param change: Change
+    :param table: table definition from REPORT_TABLES
+    :return: dictionary column index (as string, same as in json) -> sort key
+    """
+    keys = {'0': time_sort_key(change.changed_at), '1': time_sort_key(change.start_time),
+            '5': number_sort_key(change.card)}
+    # New card
+    if table['columns'][-1] == 'card' and len(table['columns']) > 6:
+        keys['6'] = number_sort_key(change.value)
+    return keys
+
+def statistics_cells(statistics):
+    """
+    Texts of the statistics rows, numbers of the changes are shown as difference to the previous file
+    :param statistics: list of the file statistics from process_downloaded_yaml
+    :return: generator of lists with row id and list of texts in the order of STATISTICS_COLUMNS
+    """
+    previous = {'ok': 0, 'dns': 0, 'card-changes': 0, 'late-starts': 0, 'comments': 0}
+    for filename, created, creator, version, stats in statistics:
+        yield ['stats-' + filename,
+               [filename, format_time(created), str(creator), str(version)] +
+               [str(stats[key] - previous[key]) for key in previous]]
+        previous = stats
+
+def time_sort_key(time):
+    """
+    Sortable key of the time - ISO format in UTC
+    """
+    if time is None:
+        return ''
+    if time.tzinfo is not None:
+        time = time.astimezone(timezone.utc)
+    return time.isoformat()
+
+def number_sort_key(value):
+    """
+    Sortable key of the card number, other values are sorted by the text same as cells without the key
+    """
+    if isinstance(value, int):
+        return str(value)
+    # Card number read as text, e.g. quoted in the report
+    text = '' if value is None else str(value).strip()
+    return text if text.isdigit() else text.lower()
+
+def change_order(change):
+    """
+    Order of the changes in the report - by time of the change
+    """
+    if change.changed_at is None:
+        return float('-inf')
+    return change.changed_at.timestamp()
+
+def format_time(time):
+    """
+    Format time of the change for the report, same as strftime('%H:%M:%S')
+    """
+    return f'{time.hour:02}:{time.minute:02}:{time.second:02}' if time is not None else ''
+
+def escape_html(value):
+    """
+    Escape text for html, most of the values do not need it
+    """
+    value = str(value)
+    return html.escape(value) if HTML_SPECIAL.search(value) else value
+
+def generate_json_feed(changes, report_name='online-report'):
+    """
+    Create json feed with rows of the report tables and delta to the previous version, used by main.js for live
+    update of the opened report
+    :param changes: dictionary of lists with changes by type from process_downloaded_yaml
+    :param report_name: name of the html report, feed is stored next to it
+    :return: version of the feed
+    """
+    tables = {}
+    for change_type in CHANGE_TYPES:
+        table = REPORT_TABLES[change_type]
+        tables[table['id']] = {
+            'columns': table['columns'],
+            'checkbox': True,
+            'rows': {change_row_id(change): {'cells': change_cells(change, table), 'sort': change_sort_keys(change, table)}
+                     for change in changes[change_type]}
+        }
+    tables['dataStatistics'] = {
+        'columns': STATISTICS_COLUMNS,
+        'checkbox': False,
+        'rows': {statistics_row_id: {'cells': cells, 'sort': {}}
+                 for statistics_row_id, cells in statistics_cells(changes['statistics'])}
+    }
+
+    # Previous version of the feed
+    try:
+        with open(report_name + '.json', encoding='utf-8') as f:
+            previous = json.load(f)
+    except (OSError, ValueError):
+        previous = {}
+    version = previous.get('version', 0)
+    previous_tables = previous.get('tables', {})
+
+    # Added, changed and removed rows by table
+    delta = {}
+    for table_id, table in tables.items():
+        previous_rows = previous_tables.get(table_id, {}).get('rows', {})
+        rows = table['rows']
+        added = {row_id: cells for row_id, cells in rows.items() if row_id not in previous_rows}
+        changed = {row_id: cells for row_id, cells in rows.items()
+                   if row_id in previous_rows and previous_rows[row_id] != cells}
+        removed = [row_id for row_id in previous_rows if row_id not in rows]
+        if added or changed or removed:
+            delta[table_id] = {'columns': table['columns'], 'checkbox': table['checkbox'],
+                               'added': added, 'changed': changed, 'removed': removed}
+
+    # Unchanged feed is not written
+    if not delta and previous:
+        return version
+
+    generated = datetime.now().isoformat(timespec='seconds')
+    write_file_atomic(report_name + '.json', json.dumps(
+        {'version': version + 1, 'generated': generated, 'tables': tables}, ensure_ascii=False))
+    write_file_atomic(report_name + '-delta.json', json.dumps(
+        {'from_version': version, 'version': version + 1, 'generated': generated, 'tables': delta},
+        ensure_ascii=False))
+    return version + 1
+
+def create_sync_server(host='', port=8001, state_file=None):
+    """
+    Create http server with solved rows shared by the opened reports
+    GET /solved/<event>?since=<version> waits for changes after the version (long polling),
+    POST /solved/<event> with json {"changes": [[table_id, row_id, solved], ...]} stores changes
+    :param host: address to listen on, empty string for all interfaces
+    :param port: port to listen on, 0 for any free port
+    :param state_file: json file with the state kept between restarts (optional)
+    :return: server, requests are handled by serve_forever
+    """
+    server = http.server.ThreadingHTTPServer((host, port), SolvedSyncHandler, bind_and_activate=False)
+    # Waiting long polls do not block the exit, dozens of browsers can connect at once
+    server.daemon_threads = True
+    server.request_queue_size = 128
+    try:
+        server.server_bind()
+        server.server_activate()
+    except OSError:
+        server.server_close()
+        raise
+    server.solved = {'events': load_solved_state(state_file), 'condition': threading.Condition(),
+                     'state_file': state_file}
+    return server
+
+def load_solved_state(state_file):
+    """
+    Load solved rows stored by the sync server
+    :param state_file: path to the json file or None
+    :return: dictionary of events with version, solved rows and log of changes
+    """
+    events = {}
+    if state_file is None or not os.path.exists(state_file):
+        return events
+    with open(state_file, encoding='utf-8') as f:
+        for event, stored in json.load(f).items():
+            rows = {(table_id, row_id) for table_id, row_ids in stored['rows'].items() for row_id in row_ids}
+            events[event] = {'version': stored['version'], 'rows': rows, 'log': []}
+    return events
+
+def save_solved_state(state_file, events):
+    """
+    Store solved rows of all events
+    :param state_file: path to the json file
+    :param events: dictionary of events from load_solved_state
+    """
+    stored = {}
+    for event, state in events.items():
+        rows = {}
+        for table_id, row_id in sorted(state['rows']):
+            rows.setdefault(table_id, []).append(row_id)
+        stored[event] = {'version': state['version'], 'rows': rows}
+    write_file_atomic(state_file, json.dumps(stored, ensure_ascii=False))
+
+def apply_solved_changes(solved, event, changes):
+    """
+    Store changes of the solved rows and wake up waiting clients
+    :param solved: shared state of the sync server
+    :param event: id of the event
+    :param changes: list of [table_id, row_id, solved]
+    :return: new version of the event
+    """
+    with solved['condition']:
+        state = solved['events'].setdefault(event, {'version': 0, 'rows': set(), 'log': []})
+        for table_id, row_id, is_solved in changes:
+            key = (table_id, row_id)
+            # Repeated tick does not create a new version
+            if is_solved == (key in state['rows']):
+                continue
+            if is_solved:
+                state['rows'].add(key)
+            else:
+                state['rows'].discard(key)
+            state['version'] += 1
+            state['log'].append([state['version'], table_id, row_id, is_solved])
+
+        del state['log'][:-SOLVED_SYNC_LOG]
+        if solved['state_file'] is not None:
+            save_solved_state(solved['state_file'], solved['events'])
+        solved['condition'].notify_all()
+        return state['version']
+
+def wait_solved_changes(solved, event, since=None, timeout=SOLVED_SYNC_WAIT):
+    """
+    Get changes of the solved rows after the version, waits until some change comes or timeout
+    :param solved: shared state of the sync server
+    :param event: id of the event
+    :param since: version known by the client, None for all solved rows
+    :param timeout: max seconds to wait
+    :return: dictionary with version and changes, or all solved rows when the changes are not in the log anymore
+    """
+    with solved['condition']:
+        if since is not None:
+            solved['condition'].wait_for(
+                lambda: solved['events'].get(event, {'version': 0})['version'] != since, timeout)
+        state = solved['events'].get(event, {'version': 0, 'rows': set(), 'log': []})
+
+        # Client knows the version and the changes since it are still in the log
+        first_logged = state['log'][0][0] if state['log'] else state['version'] + 1
+        if since is not None and since <= state['version'] and since >= first_logged - 1:
+            return {'version': state['version'],
+                    'changes': [change[1:] for change in state['log'] if change[0] > since]}
+
+        rows = {}
+        for table_id, row_id in state['rows']:
+            rows.setdefault(table_id, []).append(row_id)
+        return {'version': state['version'], 'rows': rows}
+
+class SolvedSyncHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Requests of the solved state sync server
+    """
+    # Keep-alive connections, the browsers poll all the time
+    protocol_version = 'HTTP/1.1'
+
+    def do_OPTIONS(self):
+        self.send_json(204, None)
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        event = self.get_event(url.path)
+        if event is None:
+            return
+        query = urllib.parse.parse_qs(url.query)
+        try:
+            since = int(query['since'][0]) if 'since' in query else None
+        except ValueError:
+            self.send_json(400, {'error': 'invalid version'})
+            return
+        self.send_json(200, wait_solved_changes(self.server.solved, event, since))
+
+    def do_POST(self):
+        event = self.get_event(urllib.parse.urlsplit(self.path).path)
+        if event is None:
+            return
+        # Body which is not read leaves the keep-alive connection out of sync, it is closed
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.send_json(400, {'error': 'invalid content length'})
+            self.close_connection = True
+            return
+        if length > SOLVED_SYNC_MAX_BODY:
+            self.send_json(413, {'error': 'request too large'})
+            self.close_connection = True
+            return
+        try:
+            changes = json.loads(self.rfile.read(length))['changes']
+            changes = [[str(table_id), str(row_id), bool(is_solved)] for table_id, row_id, is_solved in changes]
+        except (ValueError, KeyError, TypeError):
+            self.send_json(400, {'error': 'invalid changes'})
+            return
+        self.send_json(200, {'version': apply_solved_changes(self.server.solved, event, changes)})
+
+    def get_event(self, path):
+        """
+        Get event id from the path, error is sent for other paths
+        """
+        parts = path.split('/')
+        if len(parts) != 3 or parts[1] != 'solved' or not parts[2]:
+            self.send_json(404, {'error': 'not found'})
+            # Body of the request is not read
+            self.close_connection = True
+            return None
+        return urllib.parse.unquote(parts[2])
+
+    def send_json(self, status, data):
+        """
+        Send json response, reports opened from another address or file are allowed
+        """
+        body = b'' if data is None else json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Cache-Control', 'no-store')
+        if data is not None:
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Long polls would flood the output
+        pass
+
+@contextlib.contextmanager
+def measure_stage(stage):
+    """
+    Measure wall and cpu time of the stage of the run
+    :param stage: name of the stage, metrics <stage>_seconds and <stage>_cpu_seconds are recorded
+    """
+    start, start_cpu = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        add_metric(stage + '_seconds', time.perf_counter() - start)
+        add_metric(stage + '_cpu_seconds', time.process_time() - start_cpu)
+
+def reset_metrics():
+    """
+    Start metrics of a new run
+    """
+    with METRICS_LOCK:
+        METRICS.clear()
+        for name in METRICS_COUNTERS:
+            METRICS[(name, ())] = 0
+
+def add_metric(name, value=1, **labels):
+    """
+    Add value to the metric of the current run, safe for the download threads
+    :param name: name of the metric
+    :param value: added value
+    :param labels: labels of the metric, e.g. change_type
+    """
+    key = (name, tuple(sorted(labels.items())))
+    with METRICS_LOCK:
+        METRICS[key] = METRICS.get(key, 0) + value
+
+def write_metrics(report_name='online-report', formats=('json',)):
+    """
+    Write metrics of the current run next to the report - <report>-metrics.json and/or <report>-metrics.prom
+    :param report_name: name of the html report
+    :param formats: list of formats - 'json' and 'prometheus' (text format for node exporter textfile collector)
+    """
+    with METRICS_LOCK:
+        metrics = sorted(METRICS.items())
+    report = os.path.basename(report_name)
+
+    if 'json' in formats:
+        data = {'report': report, 'time': datetime.now(timezone.utc).isoformat(timespec='seconds'), 'metrics': {}}
+        for (name, labels), value in metrics:
+            if labels:
+                data['metrics'].setdefault(name, {})[','.join(str(v) for _, v in labels)] = value
+            else:
+                data['metrics'][name] = value
+        write_file_atomic(report_name + '-metrics.json', json.dumps(data, indent=2))
+
+    if 'prometheus' in formats:
+        lines = []
+        for (name, labels), value in metrics:
+            if not lines or not lines[-1].startswith(METRICS_PREFIX + name + '{'):
+                lines.append(f'# TYPE {METRICS_PREFIX}{name} gauge')
+            label_text = ','.join(f'{k}="{escape_label(v)}"' for k, v in (('report', report),) + labels)
+            lines.append(f'{METRICS_PREFIX}{name}{{{label_text}}} {value}')
+        lines.append(f'{METRICS_PREFIX}last_run_timestamp_seconds{{report="{escape_label(report)}"}} '
+                     f'{time.time():.0f}')
+        write_file_atomic(report_name + '-metrics.prom', '\n'.join(lines) + '\n')
+
+def escape_label(value):
+    """
+    Escape value of the label in the Prometheus text format
+    """
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def profile_run(config, path, event_id=None):
+    """
+    Download, process and render the report once under cProfile, parallel downloads are not profiled
+    :param config: loaded config module, first event is used when there are more events
+    :param path: path to the file with profile data, it can be read by pstats or snakeviz
+    :param event_id: id of the event (optional)
+    """
+    if getattr(config, 'events', None):
+        config = event_config(config, 0)
+    report_name = getattr(config, 'report_name', 'online-report')
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        downloaded_files = download_file_from_ftp(**config.ftp_server_credentials)
+        run_pipeline(downloaded_files, config, report_name, event_id or getattr(config, 'event_id', None))
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+    print(f"Profile stored in {path}, slowest functions:")
+    pstats.Stats(profiler).sort_stats('cumulative').print_stats(20)
+
+def parse_args() -> argparse.Namespace:
     """
     Parse input arguments
     """
-    if len(sys.argv) != 3:
-        program = sys.argv[0]
-        print(f"Usage: {program} <config.py> <qe_event_id>", file=sys.stderr)
-        sys.exit(1)
-    return sys.argv[1], sys.argv[2]
+    parser = argparse.ArgumentParser(description='Create html report with changes from O Checklist reports')
+    parser.add_argument('config', nargs='?',
+                        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.py'),
+                        help='path to config.py (default: config.py next to the script)')
+    parser.add_argument('event_id', nargs='?', help='event id, solved rows in the browser are stored under it (default: day of the reports)')
+    parser.add_argument('--daemon', action='store_true',
+                        help='keep running and refresh the report in regular intervals')
+    parser.add_argument('--interval', type=float, default=30,
+                        help='seconds between two polls in daemon mode (default: 30)')
+    parser.add_argument('--keepalive', type=float, default=60,
+                        help='max seconds between NOOPs on the idle ftp connection (default: 60)')
+    parser.add_argument('--profile', nargs='?', const='online-report.prof', metavar='FILE',
+                        help='run once under cProfile and store the profile (default: online-report.prof)')
+    parser.add_argument('--sync', action='store_true',
+                        help='share solved rows between the opened reports over http (solved_sync in config.py), '
+                             'only in daemon mode')
+    args = parser.parse_args()
+    # Sync server must outlive the run, scheduled one-shot runs would block each other on its port
+    if args.sync and not args.daemon:
+        parser.error('--sync requires --daemon')
+    return args
+
+def load_config(path):
+    """
+    Load config file
+    :param path: path to config.py
+    :return: loaded config module
+    """
+    spec = importlib.util.spec_from_file_location('config', path)
+    if spec is None:
+        sys.exit(f"Config file {path} can not be loaded")
+    config = importlib.util.module_from_spec(spec)
+    try:
+        spec.loader.exec_module(config)
+    except FileNotFoundError:
+        sys.exit(f"Config file {path} not found, rename example-config.py to config.py")
+    return config
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,73 @@
+import io
+import json
+import contextlib
+import yaml
+import pytest
+from datetime import datetime
+import process_ochecklist_report as report
+
+START = datetime(2023, 5, 16, 10, 0)
+
+def change(runner_id, start_time=START, class_name='H21', card=123456, **values):
+    return report.Change(runner_id, start_time, START, 'Lincoln Miller', class_name, 'Fife', card, **values)
+
+def test_row_id_is_unique_for_runners_with_same_start():
+    ids = {report.change_row_id(change(runner_id)) for runner_id in ('1', '2')}
+    assert ids == {'runner-1', 'runner-2'}
+
+def test_row_id_is_same_after_completion_from_startlist():
+    startlist = {'persons': {'1': ('H21', 'Fife', START)}, 'cards': {'123456': ('H21', 'Fife', START)}}
+    for runner_id in ('1', ''):
+        reported = change(runner_id, start_time=None, class_name='', value='Late')._replace(club='')
+        completed = report.complete_change(reported, startlist)
+        assert completed.start_time == START
+        assert report.change_row_id(completed) == report.change_row_id(reported)
+
+def test_row_id_of_runner_without_id_follows_name_and_card():
+    ids = {report.change_row_id(change('', card=card)._replace(name=name))
+           for name, card in (('Lincoln Miller', 1), ('Stella Watson', 1), ('Lincoln Miller', 2))}
+    assert len(ids) == 3
+
+def test_json_feed_keeps_all_rows_of_mass_start(tmp_path):
+    changes = {change_type: [] for change_type in report.CHANGE_TYPES}
+    changes['dns'] = [change(str(runner_id)) for runner_id in range(3)]
+    changes['statistics'] = []
+    report_name = str(tmp_path / 'online-report')
+
+    report.generate_json_feed(changes, report_name)
+    with open(report_name + '.json', encoding='utf-8') as f:
+        feed = json.load(f)
+    assert len(feed['tables'][report.REPORT_TABLES['dns']['id']]['rows']) == 3
+
+def test_different_comments_of_runner_are_kept():
+    index = {}
+    report.merge_change(index, change('1', value='Late'), 'start-1.yaml')
+    report.merge_change(index, change('1', value='No bib'), 'start-2.yaml')
+    report.merge_change(index, change('1', value='Late'), 'start-2.yaml')
+
+    assert sorted((c.value, c.sources) for c in index.values()) == [
+        ('Late', ('start-1.yaml', 'start-2.yaml')), ('No bib', ('start-2.yaml',))]
+    assert len({report.change_row_id(c) for c in index.values()}) == 2
+
+def test_card_sort_key_of_text_value():
+    assert report.number_sort_key(123456) == '123456'
+    assert report.number_sort_key(' 123456') == '123456'
+    assert report.number_sort_key('Rental') == 'rental'
+    assert report.number_sort_key(None) == ''
+
+def test_yaml_value_which_is_not_scalar_is_left_to_yaml(tmp_path):
+    with pytest.raises(ValueError):
+        report.parse_yaml_scalar('{note: late}')
+    content = ('Version: 1.0\nCreator: "O Checklist 3.3.1"\nCreated: 2023-05-16T13:00:00+02:00\nData:\n'
+               '  - Runner:\n      StartStatus: Started OK\n      Id: "1"\n      Comment: {note: late}\n'
+               '    ChangeLog:\n      Comment: 2023-05-16T10:05:00+02:00\n')
+    assert report.load_report(content) == yaml.safe_load(content)
+
+    # Value is shown as text
+    report_name = str(tmp_path / 'online-report')
+    with contextlib.redirect_stdout(io.StringIO()):
+        changes = report.process_downloaded_yaml([['start-1.yaml', content]])
+    assert [c.value for c in changes['comments']] == ['{note: late}']
+    report.generate_html_report(changes, report_name)
+    with open(report_name + '.html', encoding='utf-8') as f:
+        assert '{note: late}' in f.read()
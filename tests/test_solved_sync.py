@@ -0,0 +1,46 @@
+import json
+import socket
+import threading
+import http.client
+import pytest
+import process_ochecklist_report as report
+
+@pytest.fixture
+def port():
+    server = report.create_sync_server('127.0.0.1', 0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+def post(port, body, length=None):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    try:
+        connection.putrequest('POST', '/solved/event')
+        connection.putheader('Content-Length', str(len(body)) if length is None else length)
+        connection.endheaders(body)
+        response = connection.getresponse()
+        return response.status, json.loads(response.read() or 'null')
+    finally:
+        connection.close()
+
+def test_solved_changes_are_stored(port):
+    status, data = post(port, json.dumps({'changes': [['dataDns', 'row-1', True]]}).encode('utf-8'))
+    assert (status, data) == (200, {'version': 1})
+
+@pytest.mark.parametrize('length', ['-1', 'abc'])
+def test_invalid_content_length_is_rejected(port, length):
+    assert post(port, b'', length)[0] == 400
+
+def test_too_large_request_is_rejected(port):
+    assert post(port, b'', str(report.SOLVED_SYNC_MAX_BODY + 1))[0] == 413
+
+def test_post_to_unknown_path_closes_connection(port):
+    with socket.create_connection(('127.0.0.1', port), timeout=10) as connection:
+        connection.sendall(b'POST /other HTTP/1.1\r\nHost: localhost\r\nContent-Length: 2\r\n\r\n{}'
+                           b'GET /solved/event HTTP/1.1\r\nHost: localhost\r\n\r\n')
+        response = b''
+        while chunk := connection.recv(4096):
+            response += chunk
+    assert response.startswith(b'HTTP/1.1 404') and response.count(b'HTTP/1.1') == 1
@@ -0,0 +1,101 @@
+import os
+import queue
+import functools
+import json
+import pytest
+import process_ochecklist_report as report
+from local_ftp_server import serve_ftp
+
+REPORT = 'Version: 1.0\nData:\n'
+OTHER_REPORT = 'Version: 1.0\nCreated: 2023-05-16T13:00:00+02:00\nData:\n'
+
+@pytest.fixture
+def server():
+    with serve_ftp([['start-1.yaml', REPORT], ['start-2.yaml', OTHER_REPORT]]) as server:
+        yield server
+
+def download(server, cache_dir):
+    return report.download_file_from_ftp('127.0.0.1', 'test', 'test', cache_dir=str(cache_dir),
+                                         port=server.server_address[1], timeout=10)
+
+def cache_index(cache_dir):
+    with open(os.path.join(cache_dir, report.SYNC_CACHE_INDEX), encoding='utf-8') as f:
+        return json.load(f)
+
+def test_unchanged_files_are_read_from_cache(server, tmp_path):
+    first = download(server, tmp_path)
+    server.retrieved.clear()
+
+    assert download(server, tmp_path) == first
+    assert first == [['start-1.yaml', REPORT], ['start-2.yaml', OTHER_REPORT]]
+    assert server.retrieved == []
+
+def test_cached_copy_keeps_line_endings(server, tmp_path):
+    server.files['start-1.yaml'] = REPORT.replace('\n', '\r\n').encode('utf-8')
+    first = download(server, tmp_path)
+    server.retrieved.clear()
+
+    assert download(server, tmp_path) == first
+    assert first[0][1] == REPORT.replace('\n', '\r\n')
+    assert server.retrieved == []
+
+def test_changed_fingerprint_downloads_file_again(server, tmp_path):
+    download(server, tmp_path)
+    server.retrieved.clear()
+    server.files['start-1.yaml'] = (REPORT + '  - Runner:\n').encode('utf-8')
+    server.modified['start-1.yaml'] = '20230516214000'
+
+    downloaded = download(server, tmp_path)
+    assert server.retrieved == ['start-1.yaml']
+    assert downloaded[0] == ['start-1.yaml', REPORT + '  - Runner:\n']
+    assert cache_index(tmp_path)['start-1.yaml']['fingerprint'] == [len(server.files['start-1.yaml']),
+                                                                    '20230516214000']
+
+def test_removed_file_is_dropped_from_cache(server, tmp_path):
+    download(server, tmp_path)
+    removed_path = cache_index(tmp_path)['start-2.yaml']['path']
+    del server.files['start-2.yaml']
+
+    assert download(server, tmp_path) == [['start-1.yaml', REPORT]]
+    assert list(cache_index(tmp_path)) == ['start-1.yaml']
+    assert not os.path.exists(os.path.join(tmp_path, removed_path))
+
+def test_server_without_size_and_mdtm_downloads_every_time(server, tmp_path):
+    server.fingerprints = False
+    first = download(server, tmp_path)
+    second = download(server, tmp_path)
+
+    assert first == second == [['start-1.yaml', REPORT], ['start-2.yaml', OTHER_REPORT]]
+    assert server.retrieved == ['start-1.yaml', 'start-2.yaml'] * 2
+    assert cache_index(tmp_path) == {}
+
+def test_failed_download_uses_cached_copy(server, tmp_path):
+    download(server, tmp_path)
+    server.retrieved.clear()
+    for filename in server.files:
+        server.modified[filename] = '20230516214000'
+    server.failing.add('start-1.yaml')
+
+    # Rest of the files is downloaded over a new connection
+    assert download(server, tmp_path) == [['start-1.yaml', REPORT], ['start-2.yaml', OTHER_REPORT]]
+    assert server.retrieved == ['start-2.yaml']
+    assert cache_index(tmp_path)['start-1.yaml']['fingerprint'][1] == '20230516213823'
+
+def test_parallel_connections_are_reused_between_polls(server, tmp_path):
+    connect = functools.partial(report.connect_ftp, '127.0.0.1', 'test', 'test', timeout=10,
+                                port=server.server_address[1])
+    connections = queue.LifoQueue()
+    ftp = connect()
+    try:
+        for modified in ('20230516214000', '20230516214100'):
+            for filename in server.files:
+                server.modified[filename] = modified
+            report.download_files(ftp, str(tmp_path), connect, 2, 10, connections)
+        logins = server.logins
+
+        assert sorted(server.retrieved) == ['start-1.yaml', 'start-1.yaml', 'start-2.yaml', 'start-2.yaml']
+        assert 2 <= logins <= 3
+        assert connections.qsize() == logins - 1
+    finally:
+        report.close_ftp(ftp)
+        report.close_connections(connections)